@@ -0,0 +1,196 @@
+import re
+import threading
+import traceback
+import numpy as np
+from agents.routing_agent import ROUTES
+from utils.embedding_service import shared_embedder
+from utils.logger import AgentLogger
+
+# Human readable event type for each route, so downstream consumers that expect the
+# free-text classification (and RoutingAgent.route) keep working on local results.
+EVENT_TYPES = {
+    "EarningsModelRun": "Earnings",
+    "ComplianceCheck": "Regulation",
+    "MarketImpactAnalysis": "Product Launch",
+    "GeneralAnalysis": "General",
+}
+
+# (pattern, weight) rules per route. GeneralAnalysis has no rules: it is the fallback.
+RULES = {
+    "EarningsModelRun": [
+        (r"\bearnings?\b", 1.0),
+        (r"\beps\b", 1.0),
+        (r"\b(quarterly|annual|fiscal)\s+(results|report|revenue|earnings)\b", 1.0),
+        (r"\b(beat|beats|miss|misses|missed|top|tops)\b.{0,30}\b(estimates|expectations|forecasts)\b", 1.0),
+        (r"\bguidance\b", 0.7),
+        (r"\b(revenue|profit|net income|margin)s?\b", 0.5),
+        (r"\bq[1-4]\b", 0.5),
+    ],
+    "ComplianceCheck": [
+        (r"\bregulat\w*", 1.0),
+        (r"\bantitrust\b", 1.0),
+        (r"\b(lawsuit|sued|sues|litigation)\b", 1.0),
+        (r"\b(probe|investigation|subpoena)\b", 1.0),
+        (r"\bexport\s+(controls?|ban|restrictions?|curbs?|licen[cs]es?)\b", 1.0),
+        (r"\b(sanctions?|fined|penalty|penalties)\b", 0.8),
+        (r"\b(ftc|doj|sec|european commission)\b", 0.7),
+        (r"\b(compliance|ban|banned)\b", 0.5),
+    ],
+    "MarketImpactAnalysis": [
+        (r"\blaunch\w*", 1.0),
+        (r"\bunveil\w*", 1.0),
+        (r"\b(debut|debuts|rollout|rolls out)\b", 1.0),
+        (r"\bintroduc\w*", 0.7),
+        (r"\bnew\s+(chip|product|gpu|model|platform|device|service)s?\b", 0.7),
+        (r"\b(release|releases|released)\b", 0.5),
+    ],
+}
+
+# Small labelled seed set used to build the nearest-centroid model.
+SEED_EXAMPLES = {
+    "EarningsModelRun": [
+        "Company reports quarterly earnings above analyst estimates with record revenue.",
+        "Shares fall after the firm misses EPS expectations and cuts full-year guidance.",
+        "Fiscal second quarter results show data center revenue up sharply year over year.",
+        "The company raised its revenue outlook and reported higher gross margins.",
+    ],
+    "ComplianceCheck": [
+        "Regulators open an antitrust investigation into the chipmaker's business practices.",
+        "New export restrictions bar sales of advanced processors to China.",
+        "The company was fined by the European Commission over competition violations.",
+        "Shareholders file a lawsuit alleging the firm misled investors.",
+    ],
+    "MarketImpactAnalysis": [
+        "The company unveils its next-generation GPU architecture at its developer conference.",
+        "Tech giant launches a new AI platform for enterprise customers.",
+        "The firm introduces a new product line aimed at gaming laptops.",
+        "A new chip debuts with twice the performance of the previous generation.",
+    ],
+    "GeneralAnalysis": [
+        "Analysts debate whether the stock is overvalued after its recent rally.",
+        "The Federal Reserve signals interest rates will stay higher for longer.",
+        "The chief executive discusses long-term strategy in an interview.",
+        "Investors rotate out of technology stocks amid broader market volatility.",
+    ],
+}
+
+
+class ClassifierAgent:
+    """Local event classifier: regex rules plus an embedding nearest-centroid model."""
+
+    def __init__(self, model_name: str = None, temperature: float = 0.05,
+                 rule_prior: float = 0.5, embedder=None):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.rule_prior = rule_prior
+        self.embedder = embedder
+        self._embedder_failed = False
+        self._lock = threading.Lock()
+        self.rules = {route: [(re.compile(p, re.IGNORECASE), w) for p, w in rules]
+                      for route, rules in RULES.items()}
+        self.centroid_labels = []
+        self.centroids = None
+
+    def _get_logger(self, state):
+        """Attach logger to agent if available."""
+        return AgentLogger(state) if state and "conversation_logs" in state else None
+
+    # ------------------------------------------------------------
+    # Lazily load the shared embedding service (optional dependency)
+    # ------------------------------------------------------------
+    def _get_embedder(self):
+        with self._lock:
+            if self.embedder is None:
+                self.embedder = shared_embedder(self.model_name)
+            if not self._embedder_failed and not self.embedder.available():
+                print(" Embedding model unavailable, using rules only.")
+                self._embedder_failed = True
+            return None if self._embedder_failed else self.embedder
+
+    def _encode(self, texts: list) -> np.ndarray:
+        # Normalized rows; concurrent classifications share micro-batches and the text-hash cache
+        return self._get_embedder().embed(texts)
+
+    def fit(self, examples: dict = None):
+        """Builds one normalized centroid per route from labelled example texts."""
+        examples = examples or SEED_EXAMPLES
+        if self._get_embedder() is None:
+            return self
+
+        labels = [route for route in ROUTES if examples.get(route)]
+        centroids = []
+        for route in labels:
+            centroid = self._encode(examples[route]).mean(axis=0)
+            centroids.append(centroid / max(np.linalg.norm(centroid), 1e-12))
+        self.centroid_labels = labels
+        self.centroids = np.vstack(centroids) if centroids else None
+        return self
+
+    # ------------------------------------------------------------
+    # Individual classifiers
+    # ------------------------------------------------------------
+    def rule_scores(self, text: str) -> dict:
+        """Sums the weights of distinct matching rules for every route."""
+        return {route: sum(w for pattern, w in rules if pattern.search(text))
+                for route, rules in self.rules.items()}
+
+    def classify_rules(self, text: str) -> tuple:
+        """Returns (route, confidence) from the rules, or (None, 0.0) if nothing matched."""
+        scores = sorted(self.rule_scores(text).items(), key=lambda kv: kv[1], reverse=True)
+        best_route, best = scores[0]
+        runner_up = scores[1][1] if len(scores) > 1 else 0.0
+        if best <= 0:
+            return None, 0.0
+        return best_route, (best - runner_up) / (best + self.rule_prior)
+
+    def classify_embedding(self, text: str) -> tuple:
+        """Returns (route, confidence) from the nearest centroid, or (None, 0.0) if unavailable."""
+        if self.centroids is None and not self._embedder_failed:
+            self.fit()
+        if self.centroids is None:
+            return None, 0.0
+        similarities = self.centroids @ self._encode([text])[0]
+        logits = (similarities - similarities.max()) / self.temperature
+        probs = np.exp(logits) / np.exp(logits).sum()
+        best = int(np.argmax(probs))
+        return self.centroid_labels[best], float(probs[best])
+
+    # ------------------------------------------------------------
+    # Combined classification
+    # ------------------------------------------------------------
+    def classify(self, text: str, state: dict = None) -> dict:
+        """Classifies text into a route label with a confidence score in [0, 1]."""
+        logger = self._get_logger(state)
+        try:
+            rule_route, rule_conf = self.classify_rules(text or "")
+            emb_route, emb_conf = self.classify_embedding(text or "")
+
+            if rule_route and emb_route:
+                if rule_route == emb_route:
+                    route, confidence = rule_route, 1 - (1 - rule_conf) * (1 - emb_conf)
+                else:
+                    route = rule_route if rule_conf >= emb_conf else emb_route
+                    confidence = abs(rule_conf - emb_conf)
+            elif rule_route or emb_route:
+                route, confidence = (rule_route, rule_conf) if rule_route else (emb_route, emb_conf)
+            else:
+                route, confidence = "GeneralAnalysis", 0.0
+
+            result = {
+                "route": route,
+                "classification": EVENT_TYPES[route],
+                "confidence": round(float(confidence), 4),
+                "rule": {"route": rule_route, "confidence": round(float(rule_conf), 4)},
+                "embedding": {"route": emb_route, "confidence": round(float(emb_conf), 4)},
+            }
+            if logger:
+                logger.log("ClassifierAgent", "System", f"Local classification: {route}", payload=result)
+            return result
+
+        except Exception as e:
+            error_details = traceback.format_exc()
+            if logger:
+                logger.log("ClassifierAgent", "System", f"Local classification error: {e}",
+                           level="error", traceback=error_details)
+            return {"route": "GeneralAnalysis", "classification": EVENT_TYPES["GeneralAnalysis"],
+                    "confidence": 0.0}
@@ -1,20 +1,96 @@
+import json
+import os
+import re
 import traceback
 from utils.llm_integration import call_gemini
 from utils.logger import AgentLogger
+from utils.token_accounting import estimate_tokens, note_degradation, stage_allows, stage_remaining
+
+# Rough size of one generated draft/critique/thesis, for budget checks
+THESIS_OUTPUT_TOKENS = 2000
+
+# Markdown headings ("## Risks") or bold heading lines ("**Valuation:**") delimit thesis sections
+SECTION_HEADING = re.compile(r"^\s*(#{1,6}\s+.+|\*\*[^*]+\*\*:?)\s*$")
+PREAMBLE = "(preamble)"
+
+
+def _longest_string(value) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return max((_longest_string(v) for v in value.values()), default=0)
+    if isinstance(value, list):
+        return max((_longest_string(v) for v in value), default=0)
+    return 0
+
+
+def _truncate_strings(value, cap: int):
+    if isinstance(value, str) and len(value) > cap:
+        return value[:cap] + " ...[truncated]"
+    if isinstance(value, dict):
+        return {k: _truncate_strings(v, cap) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_truncate_strings(v, cap) for v in value]
+    return value
+
+
+def split_sections(text: str) -> list:
+    """Splits a thesis into [heading, body] pairs; text before the first heading is the preamble."""
+    sections = [[PREAMBLE, []]]
+    for line in text.splitlines():
+        if SECTION_HEADING.match(line):
+            sections.append([line.strip(), []])
+        else:
+            sections[-1][1].append(line)
+    sections = [[heading, "\n".join(body).strip()] for heading, body in sections]
+    return [section for section in sections if section[0] != PREAMBLE or section[1]]
+
+
+def _heading_key(heading: str) -> str:
+    return re.sub(r"[#*:]", "", heading).strip().lower()
+
+
+def join_sections(sections: list) -> str:
+    return "\n\n".join(body if heading == PREAMBLE else f"{heading}\n{body}" for heading, body in sections).strip()
+
 
 class EvaluatorOptimizerAgent:
     def __init__(self):
-        pass
+        self.max_context_tokens = int(os.environ.get('LLM_THESIS_CONTEXT_TOKENS', 60000))
+
+    def _fit_context(self, data: dict, max_tokens: int) -> tuple:
+        """Halves the longest text fields (filings first in practice) until the data fits max_tokens."""
+        if estimate_tokens(str(data)) <= max_tokens:
+            return data, False
+        cap = _longest_string(data)
+        trimmed = data
+        while cap > 200:
+            cap //= 2
+            trimmed = _truncate_strings(data, cap)
+            if estimate_tokens(str(trimmed)) <= max_tokens:
+                break
+        return trimmed, True
 
     def _get_logger(self, state):
         """Attach logger to agent if state has conversation logs."""
         return AgentLogger(state) if state and "conversation_logs" in state else None
 
     def run(self, data: dict, state: dict = None) -> str:
-        """Runs the evaluator-optimizer workflow with detailed logging."""
+        """Runs the evaluator-optimizer workflow with detailed logging; None if any stage fails."""
 
         logger = self._get_logger(state)
         try:
+            # Smaller context when the data is larger than the context cap or the remaining budget
+            # (keeping room for the draft output plus the critique and refinement calls)
+            reserve = 5 * THESIS_OUTPUT_TOKENS
+            budget = stage_remaining("thesis")
+            max_tokens = int(min(self.max_context_tokens, max(budget - reserve, budget / 2)))
+            data, trimmed = self._fit_context(data, max_tokens)
+            if trimmed:
+                note_degradation("thesis", "smaller context", f"data trimmed to ~{max_tokens} tokens")
+                if logger:
+                    logger.log("EvaluatorOptimizerAgent", "System", f"Data trimmed to fit ~{max_tokens} tokens.")
+
             # --------------------------------------------------------------------------------
             # 1. Optimizer Stage — Draft Thesis
             # --------------------------------------------------------------------------------
@@ -25,13 +101,12 @@ class EvaluatorOptimizerAgent:
             )
             if logger:
                 logger.log("EvaluatorOptimizerAgent", "System", "Stage 1: Generating initial draft thesis.")
-            draft = call_gemini("You are a financial analyst drafting an investment thesis.", draft_prompt, json_output=False)
+            draft = call_gemini("You are a financial analyst drafting an investment thesis.", draft_prompt, json_output=False, agent="EvaluatorOptimizerAgent", stage="thesis")
 
             if not draft:
-                msg = "Failed to generate a draft."
                 if logger:
-                    logger.log("EvaluatorOptimizerAgent", "System", msg, level="error")
-                return msg
+                    logger.log("EvaluatorOptimizerAgent", "System", "Failed to generate a draft.", level="error")
+                return None
 
             if logger:
                 logger.log("EvaluatorOptimizerAgent", "System", "Draft thesis generated successfully.",
@@ -39,6 +114,13 @@ class EvaluatorOptimizerAgent:
             print("\n--- Initial Draft ---")
             print(draft)
 
+            # Critique + refinement resend the draft about three times; skip them if the budget cannot cover it
+            if not stage_allows("thesis", 3 * estimate_tokens(draft) + 2 * THESIS_OUTPUT_TOKENS):
+                note_degradation("thesis", "skipped refinement", "thesis budget exhausted after the draft")
+                if logger:
+                    logger.log("EvaluatorOptimizerAgent", "System", "Token budget exhausted: returning the draft.", level="warning")
+                return draft
+
             # --------------------------------------------------------------------------------
             # 2. Evaluator Stage — Critique Draft
             # --------------------------------------------------------------------------------
@@ -51,13 +133,12 @@ class EvaluatorOptimizerAgent:
             )
             if logger:
                 logger.log("EvaluatorOptimizerAgent", "System", "Stage 2: Evaluating draft for consistency and logic.")
-            critique = call_gemini("You are a meticulous financial evaluator.", evaluator_prompt, json_output=False)
+            critique = call_gemini("You are a meticulous financial evaluator.", evaluator_prompt, json_output=False, agent="EvaluatorOptimizerAgent", stage="thesis")
 
             if not critique:
-                msg = "Failed to generate a critique."
                 if logger:
-                    logger.log("EvaluatorOptimizerAgent", "System", msg, level="error")
-                return msg
+                    logger.log("EvaluatorOptimizerAgent", "System", "Failed to generate a critique.", level="error")
+                return None
 
             if logger:
                 logger.log("EvaluatorOptimizerAgent", "System", "Critique generated successfully.",
@@ -75,13 +156,12 @@ class EvaluatorOptimizerAgent:
             )
             if logger:
                 logger.log("EvaluatorOptimizerAgent", "System", "Stage 3: Refining draft based on critique.")
-            final_thesis = call_gemini("You are a financial analyst refining your work.", refinement_prompt, json_output=False)
+            final_thesis = call_gemini("You are a financial analyst refining your work.", refinement_prompt, json_output=False, agent="EvaluatorOptimizerAgent", stage="thesis")
 
             if not final_thesis:
-                msg = "Failed to generate the final thesis."
                 if logger:
-                    logger.log("EvaluatorOptimizerAgent", "System", msg, level="error")
-                return msg
+                    logger.log("EvaluatorOptimizerAgent", "System", "Failed to generate the final thesis.", level="error")
+                return None
 
             if logger:
                 logger.log("EvaluatorOptimizerAgent", "System", "Final polished thesis generated successfully.",
@@ -98,5 +178,69 @@ class EvaluatorOptimizerAgent:
                            f"Unhandled exception in evaluator-optimizer pipeline: {e}",
                            level="error",
                            traceback=error_details)
-            return f"Unhandled exception: {e}"
+            return None
+
+    def revise(self, thesis: str, new_data: dict, state: dict = None) -> tuple:
+        """Delta update: revises only the thesis sections affected by late-arriving data.
+
+        The model returns just the changed sections, which are spliced into the existing thesis,
+        so the cost scales with what the new data changes rather than with the thesis length.
+        Returns (thesis, incorporated) where incorporated is False if the thesis was left as is.
+        """
+        logger = self._get_logger(state)
+        try:
+            sections = split_sections(thesis)
+            new_data, trimmed = self._fit_context(new_data, int(min(self.max_context_tokens, stage_remaining("thesis") / 2)))
+            if trimmed:
+                note_degradation("thesis", "smaller context", "late data trimmed for the delta update")
+
+            delta_prompt = (
+                "Below is an investment thesis written before the following data was available, "
+                "and the newly arrived data. Revise only the sections whose content or conclusion the new "
+                "data changes (including the recommendation if it no longer holds).\n"
+                "Respond only with a JSON object mapping the exact heading of each section to change to its "
+                "full replacement text (without the heading). Omit unchanged sections. To add a section, use a "
+                "new heading as the key. Return {} if nothing changes.\n\n"
+                f"Thesis sections: {json.dumps([heading for heading, _ in sections])}\n\n"
+                f"Thesis:\n{thesis}\n\nNew data:\n{new_data}"
+            )
+            if not stage_allows("thesis", estimate_tokens(delta_prompt) + THESIS_OUTPUT_TOKENS):
+                note_degradation("thesis", "skipped delta update", "thesis budget exhausted after the draft")
+                return thesis, False
+
+            if logger:
+                logger.log("EvaluatorOptimizerAgent", "System", "Delta update: revising sections affected by late data.")
+            revisions = call_gemini("You are a financial analyst updating your thesis with new information.",
+                                    delta_prompt, json_output=True, agent="EvaluatorOptimizerAgent", stage="thesis")
+            if not isinstance(revisions, dict):
+                if logger:
+                    logger.log("EvaluatorOptimizerAgent", "System", "Invalid delta update response; keeping the draft.", level="error")
+                return thesis, False
+
+            by_key = {_heading_key(section[0]): section for section in sections}
+            added = []
+            for heading, body in revisions.items():
+                section = by_key.get(_heading_key(heading))
+                if section is not None:
+                    section[1] = str(body).strip()
+                else:
+                    added.append([heading if SECTION_HEADING.match(heading) else f"## {heading}", str(body).strip()])
+            # New sections go before the closing (recommendation) section
+            if added:
+                position = len(sections) - 1 if len(sections) > 1 else len(sections)
+                sections[position:position] = added
+
+            if logger:
+                logger.log("EvaluatorOptimizerAgent", "System", f"Delta update revised {len(revisions)} section(s).",
+                           payload={"sections": list(revisions)})
+            print(f"\n--- Delta Update: {len(revisions)} section(s) revised ---")
+            for heading in revisions:
+                print(f"  - {heading}")
+            return join_sections(sections), True
+
+        except Exception as e:
+            if logger:
+                logger.log("EvaluatorOptimizerAgent", "System", f"Unhandled exception in delta update: {e}",
+                           level="error", traceback=traceback.format_exc())
+            return thesis, False
 
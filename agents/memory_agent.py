@@ -1,15 +1,26 @@
 import json
 import os
+import threading
 import traceback
 from datetime import datetime
 from utils.logger import AgentLogger
+from utils.utils import atomic_write_json, file_lock
 
 
 class MemoryAgent:
     def __init__(self, db_path='memory_db.json'):
         self.db_path = db_path
+        self._mtime = None
+        # Guards self.memory across threads (service, background refreshes); file_lock guards other processes
+        self.lock = threading.Lock()
         self.memory = self._load_memory()
 
+    def _refresh(self):
+        """Reloads the DB if another process (worker, service) has written it since it was read."""
+        with self.lock:
+            if os.path.exists(self.db_path) and os.path.getmtime(self.db_path) != self._mtime:
+                self.memory = self._load_memory()
+
     # ------------------------------------------------------------
     # Internal helper to attach logger
     # ------------------------------------------------------------
@@ -23,6 +34,7 @@ class MemoryAgent:
         try:
             if not os.path.exists(self.db_path):
                 return {}
+            self._mtime = os.path.getmtime(self.db_path)
             with open(self.db_path, 'r') as f:
                 return json.load(f)
         except Exception as e:
@@ -32,10 +44,18 @@ class MemoryAgent:
     # ------------------------------------------------------------
     # Save memory to disk
     # ------------------------------------------------------------
-    def _save_memory(self):
+    def _save_memory(self, symbol: str = None, entry: dict = None):
+        """Saves memory; with a symbol, merges just that entry into the file as it is on disk now.
+
+        Worker processes share the memory DB, so an entry is written under a file lock on top of a
+        fresh read rather than overwriting other workers' updates with this process' stale copy.
+        """
         try:
-            with open(self.db_path, 'w') as f:
-                json.dump(self.memory, f, indent=4)
+            with self.lock, file_lock(self.db_path):
+                if symbol is not None:
+                    self.memory = self._load_memory()
+                    self.memory[symbol] = entry
+                atomic_write_json(self.db_path, self.memory)
         except Exception as e:
             print(f" Failed to save memory DB: {e}")
 
@@ -46,6 +66,7 @@ class MemoryAgent:
         """Retrieves memory for a given stock symbol."""
         logger = self._get_logger(state)
         try:
+            self._refresh()
             memory_entry = self.memory.get(symbol)
             if memory_entry:
                 if logger:
@@ -71,21 +92,22 @@ class MemoryAgent:
         logger = self._get_logger(state)
 
         try:
-            if symbol not in self.memory:
-                self.memory[symbol] = {}
-
-            self.memory[symbol] = {
+            entry = {
                 'summary': final_analysis.get('summary', ''),
                 'key_metrics': final_analysis.get('key_metrics', {}),
                 'date': datetime.now().isoformat()
             }
+            # Scores and sources let a stored thesis be served as-is (see run_analysis(serve_cached=True))
+            for key in ('evaluation', 'thesis_sources'):
+                if final_analysis.get(key):
+                    entry[key] = final_analysis[key]
 
-            self._save_memory()
+            self._save_memory(symbol, entry)
 
             msg = f"Memory updated for {symbol}"
             print(msg)
             if logger:
-                logger.log("MemoryAgent", "System", msg, payload=self.memory[symbol])
+                logger.log("MemoryAgent", "System", msg, payload=entry)
 
         except Exception as e:
             error_details = traceback.format_exc()
@@ -1,36 +1,214 @@
+import hashlib
+import json
 import os
+import re
+import threading
+from datetime import datetime, timedelta
+from agents.toolbox_agent import TOOL_REGISTRY
 from utils.llm_integration import call_gemini
 from utils.logger import AgentLogger
+from utils.utils import atomic_write_json, file_lock
+
+ARG_PATTERN = re.compile(r"^[A-Za-z0-9_.\-]{1,20}$")
+# Bump when the plan format changes; cached plans from another schema or tool registry are not reused
+PLAN_SCHEMA_VERSION = 3
+PLAN_VERSION = hashlib.sha256(json.dumps(
+    [PLAN_SCHEMA_VERSION, {name: [spec["args"], spec["output"]] for name, spec in sorted(TOOL_REGISTRY.items())}],
+    sort_keys=True).encode("utf-8")).hexdigest()[:12]
 
 class PlanningAgent:
-    def __init__(self):
-        pass
+    def __init__(self, cache_path: str = None, template_max_age_hours: float = None, plan_max_age_hours: float = None):
+        self.cache_path = cache_path or os.environ.get('PLAN_CACHE_PATH', 'plan_cache.json')
+        self.plan_max_age = timedelta(hours=float(
+            plan_max_age_hours if plan_max_age_hours is not None
+            else os.environ.get('PLAN_CACHE_MAX_AGE_HOURS', 72)))
+        self.template_max_age = timedelta(hours=float(
+            template_max_age_hours if template_max_age_hours is not None
+            else os.environ.get('PLAN_TEMPLATE_MAX_AGE_HOURS', 24)))
+        # Guards self.cache across threads; file_lock guards other processes
+        self.lock = threading.Lock()
+        self.cache = self._load_cache()
+
+    # ------------------------------------------------------------
+    # Plan cache (per symbol + plan version, and per sector template)
+    # ------------------------------------------------------------
+    def _load_cache(self):
+        try:
+            if not os.path.exists(self.cache_path):
+                return {"plans": {}, "templates": {}}
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            cache.setdefault("plans", {})
+            cache.setdefault("templates", {})
+            return cache
+        except Exception as e:
+            print(f" Failed to load plan cache: {e}")
+            return {"plans": {}, "templates": {}}
+
+    def _save_cache(self, symbol: str, entry: dict, sector: str = None, template: list = None):
+        """Merges this symbol's plan (and sector template) into the cache file shared by all workers."""
+        try:
+            with self.lock, file_lock(self.cache_path):
+                self.cache = self._load_cache()
+                for kind in ("plans", "templates"):
+                    self.cache[kind] = {key: value for key, value in self.cache[kind].items() if self._is_current(value)}
+                self.cache["plans"][symbol] = entry
+                if template is not None:
+                    self.cache["templates"][sector] = self._plan_entry(template)
+                atomic_write_json(self.cache_path, self.cache)
+        except Exception as e:
+            print(f" Failed to save plan cache: {e}")
+
+    @staticmethod
+    def _plan_entry(plan: list) -> dict:
+        return {"version": PLAN_VERSION, "plan": plan, "created_at": datetime.now().isoformat()}
+
+    def _is_current(self, entry: dict) -> bool:
+        """A cached plan or template is reused while it matches the plan schema and tool registry and is not too old."""
+        try:
+            return (entry.get("version") == PLAN_VERSION
+                    and datetime.now() - datetime.fromisoformat(entry["created_at"]) < self.plan_max_age)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return False
+
+    def _is_fresh(self, memory: dict) -> bool:
+        try:
+            return datetime.now() - datetime.fromisoformat(memory['date']) < self.template_max_age
+        except (KeyError, TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def _to_template(plan: list, symbol: str) -> list:
+        return [{**step, "args": {k: "{symbol}" if v == symbol else v for k, v in step["args"].items()}}
+                for step in plan]
+
+    # ------------------------------------------------------------
+    # Validation against the ToolboxAgent registry
+    # ------------------------------------------------------------
+    def validate_plan(self, steps: list, symbol: str, logger: AgentLogger = None) -> list:
+        """Keeps well-formed tool calls and returns them in dependency order.
+
+        Symbol arguments are pinned to the analysed symbol, and at most one step is kept per output key.
+        """
+        candidates = {}
+        # Step id (as the LLM wrote it) -> id of the kept step that dependencies on it resolve to
+        aliases = {}
+        by_output = {}
+        for index, step in enumerate(steps if isinstance(steps, list) else []):
+            if not isinstance(step, dict) or step.get("tool") not in TOOL_REGISTRY:
+                if logger:
+                    logger.log("PlanningAgent", "System", f"Dropping unknown plan step: {step}", level="warning")
+                continue
+            spec = TOOL_REGISTRY[step["tool"]]
+            raw_args = step.get("args") if isinstance(step.get("args"), dict) else {}
+
+            args = {}
+            for name, default in spec["args"].items():
+                value = symbol if name == "symbol" else str(raw_args.get(name) or default)
+                args[name] = symbol if value == "{symbol}" else value
+            if not all(ARG_PATTERN.match(v) for v in args.values()):
+                if logger:
+                    logger.log("PlanningAgent", "System", f"Dropping step with invalid args: {step}", level="warning")
+                continue
+
+            # Steps writing the same output key would overwrite each other's data
+            given_id = str(step.get("id") or f"s{index + 1}")
+            output = spec["output"].format(**{k: v.lower() for k, v in args.items()})
+            if output in by_output:
+                aliases.setdefault(given_id, by_output[output])
+                continue
+
+            # A repeated id is renumbered; dependencies on it keep pointing at its first step
+            step_id, suffix = given_id, 1
+            while step_id in candidates:
+                suffix += 1
+                step_id = f"{given_id}.{suffix}"
+            if step_id != given_id and logger:
+                logger.log("PlanningAgent", "System", f"Renumbered duplicate step id {given_id} to {step_id}",
+                           level="warning")
+            aliases.setdefault(given_id, step_id)
+            by_output[output] = step_id
+            depends_on = step.get("depends_on") or []
+            candidates[step_id] = {
+                "id": step_id,
+                "tool": step["tool"],
+                "args": args,
+                "depends_on": [str(d) for d in depends_on] if isinstance(depends_on, list) else [],
+                "output": output,
+                "reason": step.get("reason", ""),
+            }
+
+        # Resolve dependencies to kept steps, drop dangling ones, then order topologically (cycles are dropped)
+        for step in candidates.values():
+            resolved = [aliases[d] for d in step["depends_on"] if d in aliases]
+            step["depends_on"] = list(dict.fromkeys(d for d in resolved if d != step["id"]))
+        ordered, done = [], set()
+        pending = list(candidates.values())
+        while pending:
+            ready = [step for step in pending if set(step["depends_on"]) <= done]
+            if not ready:
+                if logger:
+                    logger.log("PlanningAgent", "System",
+                               f"Dropping cyclic plan steps: {[s['id'] for s in pending]}", level="warning")
+                break
+            for step in ready:
+                ordered.append(step)
+                done.add(step["id"])
+            pending = [step for step in pending if step["id"] not in done]
+        return ordered
+
+    # ------------------------------------------------------------
+    # Plan generation
+    # ------------------------------------------------------------
+    def generate_plan(self, symbol: str, state: dict, memory: dict | str = None) -> list[dict]:
+        """Generates a validated tool-call plan for a given stock symbol."""
 
-    def generate_plan(self, symbol: str, state: dict, memory: str = None) -> list[str]:
-        """Generates a research plan for a given stock symbol."""
-       
         logger = AgentLogger(state)
- 
+        if isinstance(memory, str):
+            memory = json.loads(memory)
+
+        with self.lock:
+            cached = self.cache["plans"].get(symbol)
+        if cached and self._is_current(cached):
+            logger.log("PlanningAgent", "System", f"Plan cache hit for {symbol} (planned {cached['created_at']})")
+            return cached["plan"]
+
+        sector = ((memory or {}).get('key_metrics') or {}).get('sector')
+        with self.lock:
+            template = self.cache["templates"].get(sector) if sector else None
+        if template and self._is_current(template) and self._is_fresh(memory):
+            plan = self.validate_plan(template["plan"], symbol, logger)
+            if plan:
+                logger.log("PlanningAgent", "System", f"Reusing '{sector}' sector plan template for {symbol}")
+                self._save_cache(symbol, self._plan_entry(plan))
+                return plan
+
         system_instruction = (
             "You are an expert investment analyst planning a research workflow. "
-            "Given the stock symbol and the historical memory, generate a list of the 5-7 most critical steps "
-            "(including tool calls and internal processes) to generate a final investment thesis. "
-            "Output must be a JSON array of strings."
+            "Given the stock symbol and the historical memory, choose only the tool calls needed to "
+            "generate a final investment thesis. Available tools (name: description and arguments):\n"
+            f"{json.dumps({name: {'description': spec['description'], 'args': spec['args']} for name, spec in TOOL_REGISTRY.items()}, indent=2)}\n"
+            "Output must be a JSON array of objects with keys "
+            "\"id\" (string), \"tool\" (one of the tool names), \"args\" (object), "
+            "\"depends_on\" (array of ids) and \"reason\" (string)."
         )
-        
+
         user_prompt = f"Stock Symbol: {symbol}"
         if memory:
-            user_prompt += f"\n\nHistorical Memory:\n{memory}"
-            
+            user_prompt += f"\n\nHistorical Memory:\n{json.dumps(memory)}"
+
         # Log outgoing LLM request
         logger.log("PlanningAgent", "LLM", f"Requesting research plan for {symbol}...", prompt=user_prompt)
 
-        response = call_gemini(system_instruction, user_prompt, json_output=True)
-        
-        if response and isinstance(response, list):
-            logger.log("LLM", "PlanningAgent", f"Received plan: {response}")
-            return response
+        response = call_gemini(system_instruction, user_prompt, json_output=True, agent="PlanningAgent", stage="planning")
+        plan = self.validate_plan(response, symbol, logger) if isinstance(response, list) else []
+
+        if plan:
+            logger.log("LLM", "PlanningAgent", f"Received plan: {plan}")
+            self._save_cache(symbol, self._plan_entry(plan), sector,
+                             self._to_template(plan, symbol) if sector else None)
+            return plan
         else:
-            logger.log("PlanningAgent", "LLM", f"Invalid or empty response for {symbol}", level="error") 
+            logger.log("PlanningAgent", "LLM", f"Invalid or empty response for {symbol}", level="error")
             print("Failed to generate a valid plan.")
             return []
@@ -1,15 +1,100 @@
+import json
+import os
+import random
 import traceback
+from agents.classifier_agent import ClassifierAgent
 from utils.llm_integration import call_gemini
 from utils.logger import AgentLogger
+from utils.token_accounting import estimate_tokens, note_degradation, stage_allows
+from utils.utils import file_lock
+
+CLASSIFY_SYSTEM = "You are a text classification specialist."
+CLASSIFY_PROMPT = "What is the primary event type in this text? (e.g., Earnings, Product Launch, Regulation, Macro):\n\n{text}"
+
+# Single-call fallback used when the token budget cannot cover the full chain
+FUSED_PROMPT = (
+    "Remove any boilerplate from the following text, then respond with a JSON object with keys "
+    "\"event_type\" (e.g., Earnings, Product Launch, Regulation, Macro), \"extracted_data\" "
+    "(all numerical data points such as EPS, Revenue, Guidance) and \"summary\" "
+    "(1-2 sentence key market takeaway):\n\n{text}"
+)
+# Rough output size of the full chain and of the fused call, for budget checks
+CHAIN_OUTPUT_TOKENS = 800
+FUSED_OUTPUT_TOKENS = 300
 
 class PromptChainingAgent:
-    def __init__(self):
-        pass
+    def __init__(self, classifier: ClassifierAgent = None):
+        self.classifier = classifier or ClassifierAgent()
+        self.confidence_threshold = float(os.environ.get('CLASSIFIER_CONFIDENCE_THRESHOLD', 0.75))
+        self.record_path = os.environ.get('CLASSIFIER_RECORD_PATH')
+        self.shadow_rate = float(os.environ.get('CLASSIFIER_SHADOW_RATE', 0.05))
+
+    def _record(self, text: str, local: dict, llm_classification: str = None, path: str = "llm"):
+        """Appends the article and both classifications to the recording file, if configured.
+
+        `path` is the route the pipeline took ("local" or "llm"); classifier_eval uses it to reweight
+        the shadow-labelled sample of local-path articles.
+        """
+        if not self.record_path:
+            return
+        try:
+            with file_lock(self.record_path), open(self.record_path, 'a') as f:
+                f.write(json.dumps({
+                    "text": text,
+                    "llm_classification": llm_classification,
+                    "local_route": local.get("route"),
+                    "local_confidence": local.get("confidence"),
+                    "path": path,
+                }) + "\n")
+        except Exception as e:
+            print(f" Failed to record classified article: {e}")
+
+    def _shadow_label(self, text: str) -> str:
+        """LLM label for a sample of articles the local classifier answered, so its accuracy stays measurable."""
+        if not self.record_path or random.random() >= self.shadow_rate:
+            return None
+        if not stage_allows("classifier_shadow", estimate_tokens(text) + 20):
+            return None
+        label = call_gemini(CLASSIFY_SYSTEM, CLASSIFY_PROMPT.format(text=text), json_output=False,
+                            agent="PromptChainingAgent", stage="classifier_shadow")
+        return label.strip() if label else None
 
     def _get_logger(self, state):
         """Attach logger to agent if available."""
         return AgentLogger(state) if state and "conversation_logs" in state else None
 
+    def _run_degraded(self, raw_text: str, state: dict, logger) -> dict:
+        """Budget fallback: one fused LLM call if it fits, otherwise local classification only."""
+        local = self.classifier.classify(raw_text, state)
+        results = {
+            "classification": local["classification"],
+            "route": local["route"],
+            "route_confidence": local["confidence"],
+            "classification_source": "local",
+        }
+
+        if stage_allows("prompt_chain", estimate_tokens(raw_text) + FUSED_OUTPUT_TOKENS):
+            note_degradation("prompt_chain", "fused chain", "budget too small for the full chain")
+            if logger:
+                logger.log("PromptChainingAgent", "System", "Token budget low: running fused single-call chain.")
+            fused = call_gemini("You are a financial news analyst.", FUSED_PROMPT.format(text=raw_text), json_output=True, agent="PromptChainingAgent", stage="prompt_chain")
+            if isinstance(fused, dict):
+                results["extracted_data"] = fused.get("extracted_data", {})
+                results["summary"] = str(fused.get("summary", "")).strip()
+                if local["confidence"] < self.confidence_threshold and fused.get("event_type"):
+                    # Let RoutingAgent route the LLM event type
+                    results.pop("route")
+                    results["classification"] = str(fused["event_type"]).strip()
+                    results["classification_source"] = "llm"
+                return results
+
+        note_degradation("prompt_chain", "local only", "prompt chain budget exhausted")
+        if logger:
+            logger.log("PromptChainingAgent", "System", "Token budget exhausted: local classification only.", level="warning")
+        results["extracted_data"] = {}
+        results["summary"] = raw_text.strip()[:300]
+        return results
+
     def run(self, raw_text: str, state: dict = None) -> dict:
         """Runs a 5-stage prompt chain to process raw text with detailed logging."""
 
@@ -17,13 +102,17 @@ class PromptChainingAgent:
         results = {}
 
         try:
+            # The full chain sends the text roughly four times; degrade if the budget cannot cover it
+            if not stage_allows("prompt_chain", 4 * estimate_tokens(raw_text) + CHAIN_OUTPUT_TOKENS):
+                return self._run_degraded(raw_text, state, logger)
+
             # --------------------------------------------------------------------------------
             # Stage 1: Ingest / Preprocess
             # --------------------------------------------------------------------------------
             preprocess_prompt = f"Clean the following text and remove any boilerplate content:\n\n{raw_text}"
             if logger:
                 logger.log("PromptChainingAgent", "System", "Stage 1: Preprocessing text input.")
-            clean_text = call_gemini("You are a text cleaning assistant.", preprocess_prompt, json_output=False)
+            clean_text = call_gemini("You are a text cleaning assistant.", preprocess_prompt, json_output=False, agent="PromptChainingAgent", stage="prompt_chain")
 
             if not clean_text:
                 msg = "Failed to clean text."
@@ -37,22 +126,36 @@ class PromptChainingAgent:
             print(clean_text)
 
             # --------------------------------------------------------------------------------
-            # Stage 2: Classification
+            # Stage 2: Classification (local fast path, LLM below the confidence threshold)
             # --------------------------------------------------------------------------------
-            classify_prompt = f"What is the primary event type in this text? (e.g., Earnings, Product Launch, Regulation, Macro):\n\n{clean_text}"
             if logger:
                 logger.log("PromptChainingAgent", "System", "Stage 2: Classifying text.")
-            classification = call_gemini("You are a text classification specialist.", classify_prompt, json_output=False)
-
-            if not classification:
-                msg = "Failed to classify text."
+            local = self.classifier.classify(clean_text, state)
+
+            if local["confidence"] >= self.confidence_threshold:
+                classification = local["classification"]
+                results["route"] = local["route"]
+                results["classification_source"] = "local"
+                self._record(clean_text, local, self._shadow_label(clean_text), path="local")
+            else:
                 if logger:
-                    logger.log("PromptChainingAgent", "System", msg, level="error")
-                return {"error": msg}
-
+                    logger.log("PromptChainingAgent", "System",
+                               f"Local confidence {local['confidence']} below {self.confidence_threshold}, asking LLM.")
+                classification = call_gemini(CLASSIFY_SYSTEM, CLASSIFY_PROMPT.format(text=clean_text), json_output=False, agent="PromptChainingAgent", stage="prompt_chain")
+                results["classification_source"] = "llm"
+
+                if not classification:
+                    msg = "Failed to classify text."
+                    if logger:
+                        logger.log("PromptChainingAgent", "System", msg, level="error")
+                    return {"error": msg}
+                self._record(clean_text, local, classification.strip())
+
+            results["route_confidence"] = local["confidence"]
             if logger:
-                logger.log("PromptChainingAgent", "System", "Classification complete.", payload={"classification": classification.strip()})
-            print(f"\n--- Classification ---\n{classification}")
+                logger.log("PromptChainingAgent", "System", "Classification complete.",
+                           payload={"classification": classification.strip(), "source": results["classification_source"]})
+            print(f"\n--- Classification ({results['classification_source']}) ---\n{classification}")
             results["classification"] = classification.strip()
 
             # --------------------------------------------------------------------------------
@@ -61,7 +164,7 @@ class PromptChainingAgent:
             extract_prompt = f"Extract all numerical data points (e.g., EPS, Revenue, Guidance) mentioned in the text:\n\n{clean_text}"
             if logger:
                 logger.log("PromptChainingAgent", "System", "Stage 3: Extracting numerical data.")
-            extracted_data = call_gemini("You are a data extraction expert.", extract_prompt, json_output=True)
+            extracted_data = call_gemini("You are a data extraction expert.", extract_prompt, json_output=True, agent="PromptChainingAgent", stage="prompt_chain")
 
             if not extracted_data:
                 msg = "Failed to extract data."
@@ -80,7 +183,7 @@ class PromptChainingAgent:
             summarize_prompt = f"Write a concise, abstractive summary of the key market takeaway (1-2 sentences):\n\n{clean_text}"
             if logger:
                 logger.log("PromptChainingAgent", "System", "Stage 4: Summarizing content.")
-            summary = call_gemini("You are a financial news summarizer.", summarize_prompt, json_output=False)
+            summary = call_gemini("You are a financial news summarizer.", summarize_prompt, json_output=False, agent="PromptChainingAgent", stage="prompt_chain")
 
             if not summary:
                 msg = "Failed to summarize text."
@@ -1,6 +1,8 @@
 from utils.logger import AgentLogger
 import traceback
 
+ROUTES = ("EarningsModelRun", "ComplianceCheck", "MarketImpactAnalysis", "GeneralAnalysis")
+
 class RoutingAgent:
     def __init__(self):
         pass
@@ -20,6 +22,13 @@ class RoutingAgent:
                     logger.log("RoutingAgent", "System", msg, level="error")
                 return "GeneralAnalysis"
 
+            # Route labels produced directly by the local classifier pass through unchanged
+            if classification in ROUTES:
+                if logger:
+                    logger.log("RoutingAgent", "System", f"Routing decision: {classification}",
+                               payload={"classification": classification, "next_route": classification})
+                return classification
+
             normalized_class = classification.lower().strip()
             if logger:
                 logger.log(
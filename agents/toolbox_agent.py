@@ -1,5 +1,4 @@
-import yfinance as yf
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 from newsapi import NewsApiClient
 from fredapi import Fred
@@ -7,19 +6,62 @@ from sec_api import QueryApi
 import requests
 import traceback
 
+from utils.blob_store import BlobStore
+from utils.filing_store import FilingStore
+from utils.fundamentals import shared_fetcher
+from utils.llm_integration import call_gemini
 from utils.logger import AgentLogger
+from utils.market_data import MarketDataStore
+from utils.token_accounting import estimate_tokens, note_degradation, stage_allows
+
+# Capabilities the PlanningAgent may schedule. An argument default of "{symbol}" is replaced by
+# the analysed symbol; "output" is the raw_data key the tool result is stored under.
+TOOL_REGISTRY = {
+    "yfinance": {
+        "description": "Price, valuation ratios and fundamental metrics from Yahoo Finance.",
+        "args": {"symbol": "{symbol}"},
+        "output": "yfinance",
+    },
+    "newsapi": {
+        "description": "Most relevant recent news articles about the company.",
+        "args": {"symbol": "{symbol}"},
+        "output": "news",
+    },
+    "priceHistory": {
+        "description": "Price history technicals: returns, volatility, drawdown, moving averages, RSI and beta vs the index.",
+        "args": {"symbol": "{symbol}"},
+        "output": "technicals",
+    },
+    "fred": {
+        "description": "Macroeconomic time series from FRED by series id (e.g. GDP, CPIAUCSL, UNRATE, FEDFUNDS).",
+        "args": {"indicator": "GDP"},
+        "output": "fred_{indicator}",
+    },
+    "secEdgar": {
+        "description": "Latest SEC filings (10-K, 10-Q, 8-K, SC 13D/G) for risk, valuation and report review, reported as changes since the previous comparable filing.",
+        "args": {"symbol": "{symbol}"},
+        "output": "secEdgar",
+    },
+}
 
 class ToolboxAgent:
-    def __init__(self):
+    def __init__(self, cache_seconds: float = None):
         self.cache = {}
+        # How long fetched tool data is reused in-process (warm agents reuse it across runs)
+        self.cache_max_age = timedelta(seconds=float(
+            cache_seconds if cache_seconds is not None else os.environ.get('TOOL_CACHE_SECONDS', 24 * 3600)))
         self.newsapi = NewsApiClient(api_key=os.environ.get('NEWS_API_KEY'))
         self.fred = Fred(api_key=os.environ.get('FRED_API_KEY'))
         self.sec = QueryApi(api_key=os.environ.get('SEC_API_KEY'))
+        self.market_data = MarketDataStore()
+        self.fundamentals = shared_fetcher()
+        self.blobs = BlobStore()
+        self.filings = FilingStore(blobs=self.blobs)
 
     def _is_cache_valid(self, symbol, tool_name):
         if symbol in self.cache and tool_name in self.cache[symbol]:
             timestamp = self.cache[symbol][tool_name]['timestamp']
-            if datetime.now() - timestamp < timedelta(hours=24):
+            if datetime.now() - timestamp < self.cache_max_age:
                 return True
         return False
 
@@ -43,12 +85,12 @@ class ToolboxAgent:
         try:
             print(f"Fetching data for {symbol} from {tool_name}")
             logger.log("ToolboxAgent", tool_name, f"Fetching Yahoo Finance data for {symbol}")
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            info = self.fundamentals.fetch([symbol]).row(symbol.upper())
+            if info is None:
+                logger.log("ToolboxAgent", tool_name, f"No Yahoo Finance data for {symbol}", level="error")
+                return None
 
-            if symbol not in self.cache:
-                self.cache[symbol] = {}
-            self.cache[symbol][tool_name] = {
+            self.cache.setdefault(symbol, {})[tool_name] = {
                 'timestamp': datetime.now(),
                 'data': info
             }
@@ -64,8 +106,8 @@ class ToolboxAgent:
     # -----------------------------------------------------------------------------------
     # Financial News
     # -----------------------------------------------------------------------------------
-    def get_financial_news(self, symbol: str, state: dict) -> dict:
-        """Fetches financial news for a given symbol."""
+    def get_financial_news(self, symbol: str, state: dict, since: str = None) -> dict:
+        """Fetches financial news for a given symbol, optionally only articles published after `since`."""
         tool_name = 'newsapi'
         logger = self._get_logger(state)
 
@@ -75,17 +117,20 @@ class ToolboxAgent:
             return self.cache[symbol][tool_name]['data']
 
         try:
-            print(f"Fetching news for {symbol}")
-            logger.log("ToolboxAgent", tool_name, f"Fetching news for {symbol}")
-            all_articles = self.newsapi.get_everything(
-                q=symbol,
-                language='en',
-                sort_by='relevancy',
-                page_size=5
-            )
-            if symbol not in self.cache:
-                self.cache[symbol] = {}
-            self.cache[symbol][tool_name] = {
+            if since:
+                # Run times are stored in local time but NewsAPI reads `from` as UTC; the overlap re-fetches
+                # articles indexed late, which the article store recognizes and does not process again
+                since = (datetime.fromisoformat(since).astimezone(timezone.utc)
+                         - timedelta(minutes=float(os.environ.get('NEWS_SINCE_OVERLAP_MINUTES', 60))))
+                # NewsAPI only serves about a month of history, so older bounds are dropped
+                since = since.strftime("%Y-%m-%dT%H:%M:%S") if since > datetime.now(timezone.utc) - timedelta(days=29) else None
+            print(f"Fetching news for {symbol}" + (f" since {since}" if since else ""))
+            logger.log("ToolboxAgent", tool_name, f"Fetching news for {symbol}", since=since)
+            query = {"q": symbol, "language": 'en', "sort_by": 'relevancy', "page_size": 5}
+            if since:
+                query["from_param"] = since
+            all_articles = self.newsapi.get_everything(**query)
+            self.cache.setdefault(symbol, {})[tool_name] = {
                 'timestamp': datetime.now(),
                 'data': all_articles
             }
@@ -99,6 +144,38 @@ class ToolboxAgent:
             logger.log("ToolboxAgent", tool_name, f"Error fetching news for {symbol}: {e}", level="error", traceback=error_details)
             return None
 
+    # -----------------------------------------------------------------------------------
+    # Price History Technicals
+    # -----------------------------------------------------------------------------------
+    def get_price_history(self, symbol: str, state: dict) -> dict:
+        """Fetches OHLCV history (incrementally, in bulk) and returns the symbol's technical feature row."""
+        tool_name = 'priceHistory'
+        logger = self._get_logger(state)
+
+        if self._is_cache_valid(symbol, tool_name):
+            print(f"Returning cached data for {symbol} from {tool_name}")
+            logger.log("ToolboxAgent", tool_name, f"Cache hit for {symbol}")
+            return self.cache[symbol][tool_name]['data']
+
+        try:
+            print(f"Fetching data for {symbol} from {tool_name}")
+            logger.log("ToolboxAgent", tool_name, f"Computing price history technicals for {symbol}")
+            # Workers prefetch queued symbols in one bulk download (worker.py); then nothing is stale here
+            refresh = bool(self.market_data.stale([symbol.upper(), self.market_data.index_symbol]))
+            features = self.market_data.features([symbol], refresh=refresh).get(symbol.upper())
+
+            self.cache.setdefault(symbol, {})[tool_name] = {
+                'timestamp': datetime.now(),
+                'data': features
+            }
+            logger.log(tool_name, "ToolboxAgent", f"Computed technicals for {symbol}", payload=features)
+            return features
+        except Exception as e:
+            error_details = traceback.format_exc()
+            logger.log("ToolboxAgent", tool_name, f"Error computing technicals for {symbol}: {e}", level="error", traceback=error_details)
+            print(f" Price history Error for {symbol}: {e}")
+            return None
+
     # -----------------------------------------------------------------------------------
     # Economic Data
     # -----------------------------------------------------------------------------------
@@ -117,13 +194,14 @@ class ToolboxAgent:
 
             logger.log(tool_name, "ToolboxAgent", f"Successfully fetched {len(data)} records for {indicator}")
 
-            if indicator not in self.cache:
-                self.cache[indicator] = {}
-            self.cache[indicator][tool_name] = {
+            # The full series lives in the blob store; callers get a handle
+            series = self.blobs.put_json({str(k.date()) if hasattr(k, 'date') else str(k): v
+                                          for k, v in data.to_dict().items()})
+            self.cache.setdefault(indicator, {})[tool_name] = {
                 'timestamp': datetime.now(),
-                'data': data.to_dict()
+                'data': series
             }
-            return data.to_dict()
+            return series
         except Exception as e:
             error_details = traceback.format_exc()
             print(f"An error occurred with FRED for indicator {indicator}: {e}")
@@ -162,54 +240,57 @@ class ToolboxAgent:
             logger.log("ToolboxAgent", tool_name, f"Fetching latest SEC filings for {indicator}")
             data = self.sec.get_filings(query)["filings"]
 
-            filingDataRaw = {}
+            filingData = {}
             folder_path = os.path.join("..", "utils", "filingDocuments", indicator)
             os.makedirs(folder_path, exist_ok=True)
 
-            for filing in data:
-                folder_path = "..\\utils\\filingDocuments\\"+(indicator)
-                os.makedirs(folder_path, exist_ok=True)
-                form_type = filing["formType"].replace("/", "-")
-                description = filing["description"].replace("/", "-")
-                
-                fileType = {}
-
-                for doc in filing.get("documentFormatFiles", []):
-                    doc_url = doc.get("documentUrl", "")
-                    if not doc_url:
-                        continue
-
-                    file_ext = os.path.splitext(doc_url)[1]
-                    file_name = f"{form_type}-{description}{file_ext}"
-                    file_path = os.path.join(folder_path, file_name)
-
-                    if file_ext in [".txt", ".htm", ".html"]:
-                        try:
-                            response = requests.get(doc_url, timeout=10)
-                            response.raise_for_status()
-                            with open(file_path, "wb") as f:
-                                f.write(response.content)
-                            filingDataRaw[file_name] = response.content.decode("utf-8", errors="ignore")
-
-                            logger.log(tool_name, "ToolboxAgent", f"Saved filing {file_name} for {indicator}")
-                        except Exception as e:
-                            error_details = traceback.format_exc()
-                            logger.log("ToolboxAgent", tool_name,
-                                       f"Error downloading {file_name} for {indicator}: {e}",
-                                       level="error", traceback=error_details)
-                    else:
-                        logger.log("ToolboxAgent", tool_name, f"Skipping unsupported file type: {file_ext}")
-
-            
+            # Oldest first, so a newer 10-Q in the same batch is compared with an older one
+            for filing in sorted(data, key=lambda f: f.get("filedAt", "")):
+                form_type = filing["formType"]
+                description = filing.get("description", form_type).replace("/", "-")
+                label = f"{form_type.replace('/', '-')}-{description}"
+                accession = filing.get("accessionNo")
+
+                # A filing never changes once filed: reuse its stored delta without downloading it again
+                if accession and self.filings.get(accession):
+                    filingData[label] = self.filings.delta_text(accession)
+                    logger.log(tool_name, "ToolboxAgent", f"Reusing processed filing {accession} for {indicator}")
+                    continue
+
+                documents = [doc for doc in filing.get("documentFormatFiles", [])
+                             if os.path.splitext(doc.get("documentUrl", ""))[1] in (".txt", ".htm", ".html")]
+                primary = next((doc for doc in documents if doc.get("type") == form_type), documents[0] if documents else None)
+                if primary is None:
+                    logger.log("ToolboxAgent", tool_name, f"No supported document in filing {accession}")
+                    continue
+
+                doc_url = primary["documentUrl"]
+                file_name = f"{label}{os.path.splitext(doc_url)[1]}"
+                try:
+                    # SEC EDGAR rejects requests without a declared User-Agent
+                    response = requests.get(doc_url, timeout=10,
+                                            headers={"User-Agent": os.environ.get('SEC_USER_AGENT', 'research-agent admin@example.com')})
+                    response.raise_for_status()
+                    with open(os.path.join(folder_path, file_name), "wb") as f:
+                        f.write(response.content)
+
+                    filingData[label] = self.filings.process(
+                        accession or doc_url, indicator, form_type, filing.get("filedAt", ""), description,
+                        response.content, summarize=lambda sections: self._summarize_sections(sections, form_type, state))
+                    logger.log(tool_name, "ToolboxAgent", f"Saved and diffed filing {file_name} for {indicator}")
+                except Exception as e:
+                    error_details = traceback.format_exc()
+                    logger.log("ToolboxAgent", tool_name,
+                               f"Error downloading {file_name} for {indicator}: {e}",
+                               level="error", traceback=error_details)
+
             # Update cache after successful fetch
-            if indicator not in self.cache:
-                self.cache[indicator] = {}
-            self.cache[indicator][tool_name] = {
+            self.cache.setdefault(indicator, {})[tool_name] = {
                 'timestamp': datetime.now(),
-                'data': filingDataRaw
+                'data': filingData
             }
-            logger.log(tool_name, "ToolboxAgent", f"Fetched and cached {len(filingDataRaw)} filings for {indicator}")
-            return filingDataRaw
+            logger.log(tool_name, "ToolboxAgent", f"Fetched and cached {len(filingData)} filings for {indicator}")
+            return filingData
         except Exception as e:
             error_details = traceback.format_exc()
             print(f" SEC EDGAR Error for {indicator}: {e}")
@@ -218,17 +299,43 @@ class ToolboxAgent:
                        level="error", traceback=error_details)
             return None
 
-    def fetch(self, tool_name: str, symbol: str, state: dict) -> dict:
+    def _summarize_sections(self, sections: dict, form_type: str, state: dict) -> dict:
+        """One LLM call summarizing unchanged filing sections (or unchanged parts of changed ones) without a cached summary."""
+        prompt = (
+            f"Summarize each of the following unchanged {form_type} sections or passages in one or two sentences, "
+            "keeping any figures, risks or commitments an investor would need. Respond only with a JSON "
+            "object mapping each section key to its summary.\n\n"
+            + "\n\n".join(f"[{key}]\n{text[:3000]}" for key, text in sections.items())
+        )
+        if not stage_allows("filings", estimate_tokens(prompt) + 100 * len(sections)):
+            note_degradation("filings", "extractive summaries", "filings budget exhausted")
+            return {}
+        summaries = call_gemini("You are a financial analyst summarizing SEC filings.", prompt,
+                                json_output=True, agent="ToolboxAgent", stage="filings")
+        if not isinstance(summaries, dict):
+            self._get_logger(state).log("ToolboxAgent", "secEdgar", "Invalid section summary response", level="error")
+            return {}
+        return {key: str(value) for key, value in summaries.items()}
+
+    def fetch(self, tool_name: str, symbol: str, state: dict, since: str = None) -> dict:
         """Dynamically dispatches to the correct tool wrapper."""
         if tool_name == 'yfinance':
             return self.get_yahoo_finance_data(symbol, state)
         elif tool_name == 'newsapi':
-            return self.get_financial_news(symbol, state)
+            return self.get_financial_news(symbol, state, since=since)
+        elif tool_name == 'priceHistory':
+            return self.get_price_history(symbol, state)
         elif tool_name == 'fred':
             return self.get_economic_data(symbol, state)
         elif tool_name == 'secEdgar':
             return self.get_filing_data(symbol, state)
         else:
             print(f"Tool {tool_name} not recognized.")
-            logger.log(tool_name, "ToolboxAgent", f"Tool {tool_name} not recognized")
+            self._get_logger(state).log(tool_name, "ToolboxAgent", f"Tool {tool_name} not recognized")
             return None
+
+    def invoke(self, step: dict, state: dict, since: str = None) -> dict:
+        """Executes a validated plan step of the form {"tool", "args", ...}."""
+        # Every registered tool takes a single argument (a symbol or an indicator)
+        argument = next(iter(step.get("args", {}).values()), None)
+        return self.fetch(step.get("tool"), argument, state, since=since)
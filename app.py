@@ -1,5 +1,13 @@
 import streamlit as st
-from main import run_analysis
+from main import cached_analysis, is_refreshing, run_analysis
+
+
+def format_age(seconds: float) -> str:
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}"
+    return f"{seconds:.0f}s"
+
 
 st.set_page_config(page_title="Investment Research Agent", layout="wide")
 
@@ -7,32 +15,58 @@ st.title(" Investment Research Dashboard")
 st.markdown("Analyze stocks using multi-agent financial intelligence")
 
 # Input field for stock symbol
-symbol = st.text_input("Enter stock symbol:", "NVDA")
+symbol = st.text_input("Enter stock symbol:", "NVDA").strip().upper()
+force_refresh = st.checkbox("Ignore stored thesis and run the full analysis", value=False)
 
-# Button to trigger analysis
-if st.button(" Run Analysis"):
+# Button to trigger analysis; the symbol stays selected across reruns so a refreshed thesis can be swapped in
+clicked = st.button(" Run Analysis")
+if clicked:
+    st.session_state["symbol"] = symbol
+
+if st.session_state.get("symbol"):
+    symbol = st.session_state["symbol"]
     with st.spinner(f"Running investment analysis for {symbol}..."):
         try:
-            result = run_analysis(symbol)
-            st.success(f" Analysis for {symbol} completed!")
+            if clicked:
+                # A stored thesis within the freshness window is returned immediately; a stale one is
+                # returned too while a background refresh runs
+                result = run_analysis(symbol, serve_cached=not force_refresh)
+            else:
+                # Reruns (any widget interaction) only show the stored thesis; they never start a run
+                result = cached_analysis(symbol, refresh=False)
+                if result is None:
+                    st.session_state.pop("symbol", None)
+            if clicked and (result is None or isinstance(result, str)):
+                st.session_state.pop("symbol", None)
+                st.error(result or f"Could not generate a plan for {symbol}.")
+            elif result is not None:
+                freshness = result.get("freshness") or {}
+                if freshness.get("source") == "memory":
+                    st.success(f" Stored analysis for {symbol} from {format_age(freshness['age_seconds'])} ago")
+                    if is_refreshing(symbol):
+                        st.info("This thesis is stale and is being refreshed in the background. "
+                                "Click below to show the new result once it is ready.")
+                        st.button("Check for refreshed thesis")
+                else:
+                    st.success(f" Analysis for {symbol} completed!")
 
-            # Display Final Thesis
-            st.subheader(" Final Investment Thesis")
-            st.write(result.get("final_thesis", "No thesis generated."))
+                # Display Final Thesis
+                st.subheader(" Final Investment Thesis")
+                st.write(result.get("final_thesis", "No thesis generated."))
 
-            # Display Evaluation Metrics
-            if "evaluation" in result:
-                eval_data = result["evaluation"]
+                # Display Evaluation Metrics
+                if result.get("evaluation"):
+                    eval_data = result["evaluation"]
 
-                st.subheader(" Evaluation Summary")
-                st.metric("Clarity", eval_data["clarity"])
-                st.metric("Accuracy", eval_data["accuracy"])
-                st.metric("Rigor", eval_data["rigor"])
+                    st.subheader(" Evaluation Summary")
+                    st.metric("Clarity", eval_data["clarity"])
+                    st.metric("Accuracy", eval_data["accuracy"])
+                    st.metric("Rigor", eval_data["rigor"])
 
-                st.markdown(f"**Evaluator Source:** {eval_data.get('source', 'unknown')}")
-                with st.expander("View Full Evaluation Summary"):
-                    st.write(eval_data.get("evaluation_summary", "No detailed summary available."))
+                    st.markdown(f"**Evaluator Source:** {eval_data.get('source', 'unknown')}")
+                    with st.expander("View Full Evaluation Summary"):
+                        st.write(eval_data.get("evaluation_summary", "No detailed summary available."))
 
         except Exception as e:
+            st.session_state.pop("symbol", None)
             st.error(f" Error during analysis: {str(e)}")
-
@@ -0,0 +1,48 @@
+import argparse
+import json
+import os
+from datetime import datetime
+from evaluation.evaluator import MultiAgentEvaluator
+from utils.profiler import StageProfiler
+from utils.utils import load_env
+
+
+def load_theses(path: str) -> list:
+    """Loads {"symbol", "thesis"} items from a JSON list or a JSON-lines file."""
+    with open(path, 'r') as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grade a batch of theses and write a compact score table.")
+    parser.add_argument("path", help="JSON or JSON-lines file of {\"symbol\", \"thesis\"} items.")
+    parser.add_argument("--memory", default="memory_db.json", help="Memory DB used as each symbol's thesis history.")
+    parser.add_argument("--out", default="evaluation/scores.csv", help="Where to write the score table (CSV).")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent grading requests.")
+    parser.add_argument("--profile", nargs="?", const="profiles", metavar="DIR",
+                        help="Profile CPU and memory of the grading stages and write a report under DIR.")
+    parser.add_argument("--profile-collapsed", action="store_true", help="Also dump collapsed stacks for flamegraphs.")
+    args = parser.parse_args()
+
+    load_env()
+    items = load_theses(args.path)
+    try:
+        with open(args.memory, 'r') as f:
+            history = json.load(f)
+    except FileNotFoundError:
+        history = {}
+
+    if args.profile:
+        out_dir = os.path.join(args.profile, f"batch-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        with StageProfiler(out_dir, collapsed=args.profile_collapsed) as profiler:
+            with profiler.stage("grader_init"):
+                evaluator = MultiAgentEvaluator()
+            with profiler.stage("grading"):
+                table = evaluator.evaluate_batch(items, history=history, out_path=args.out, max_workers=args.workers)
+    else:
+        table = MultiAgentEvaluator().evaluate_batch(items, history=history, out_path=args.out, max_workers=args.workers)
+    for row in table:
+        print(row)
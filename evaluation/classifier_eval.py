@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import tempfile
+from collections import Counter
+from agents.classifier_agent import ClassifierAgent
+from agents.prompt_chaining_agent import CLASSIFY_PROMPT, CLASSIFY_SYSTEM
+from agents.routing_agent import ROUTES, RoutingAgent
+from utils.utils import file_lock
+
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.75, 0.8, 0.9)
+
+
+def load_recorded_articles(path: str) -> list:
+    """Loads recorded articles (one JSON object per line with 'text' and 'llm_classification')."""
+    articles = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                articles.append(json.loads(line))
+    return articles
+
+
+def recorded_path(article: dict) -> str:
+    """Route the pipeline took for a recorded article; older records have no 'path' field."""
+    return article.get("path") or ("llm" if article.get("llm_classification") else "local")
+
+
+def save_labels(path: str, articles: list):
+    """Writes labelled articles back to the recording file, keeping lines appended since it was read."""
+    with file_lock(path):
+        current = load_recorded_articles(path) if os.path.exists(path) else []
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            for article in articles + current[len(articles):]:
+                f.write(json.dumps(article) + "\n")
+        os.replace(tmp_path, path)
+
+
+def label_missing(articles: list) -> int:
+    """Fills in missing LLM classifications with the same prompt used by PromptChainingAgent."""
+    from utils.llm_integration import call_gemini
+    from utils.utils import load_env
+
+    load_env()
+    labelled = 0
+    for article in articles:
+        if not article.get("llm_classification"):
+            article["path"] = recorded_path(article)
+            classification = call_gemini(CLASSIFY_SYSTEM, CLASSIFY_PROMPT.format(text=article["text"]), json_output=False, agent="ClassifierEval", stage="classification_eval")
+            if classification:
+                article["llm_classification"] = classification.strip()
+                labelled += 1
+    return labelled
+
+
+def evaluate(articles: list, classifier: ClassifierAgent, thresholds=DEFAULT_THRESHOLDS) -> dict:
+    """Compares local routes against routes derived from the LLM classification.
+
+    For each threshold, 'coverage' is the share of articles the local path answers on its own,
+    'local_accuracy' the agreement with the LLM on that share, and 'pipeline_accuracy' the
+    agreement of the combined pipeline (articles below the threshold fall back to the LLM).
+
+    Articles that took the LLM path are all labelled, but only a sample of local-path articles is
+    (shadow labels, or --label-missing). Each labelled local-path article is weighted by
+    (local-path articles / labelled ones) so the metrics describe all recorded articles.
+    """
+    router = RoutingAgent()
+    local_total = sum(recorded_path(article) == "local" for article in articles)
+    local_labelled = sum(recorded_path(article) == "local" and bool(article.get("llm_classification"))
+                         for article in articles)
+    local_weight = local_total / local_labelled if local_labelled else 0.0
+
+    rows = []
+    for article in articles:
+        if not article.get("llm_classification"):
+            continue
+        local = classifier.classify(article["text"])
+        weight = local_weight if recorded_path(article) == "local" else 1.0
+        rows.append((router.route(article["llm_classification"]), local["route"], local["confidence"], weight))
+
+    total = sum(w for _, _, _, w in rows)
+    confusion = Counter((expected, predicted) for expected, predicted, _, _ in rows)
+    report = {
+        "n_articles": len(rows),
+        "n_recorded": len(articles),
+        "local_path_labelled": f"{local_labelled}/{local_total}",
+        "overall_accuracy": sum(w for e, p, _, w in rows if e == p) / total if total else 0.0,
+        "confusion": {expected: {predicted: confusion[(expected, predicted)] for predicted in ROUTES}
+                      for expected in ROUTES},
+        "thresholds": [],
+    }
+    for threshold in thresholds:
+        covered = [(e, p, w) for e, p, c, w in rows if c >= threshold]
+        covered_weight = sum(w for _, _, w in covered)
+        correct = sum(w for e, p, w in covered if e == p)
+        report["thresholds"].append({
+            "threshold": threshold,
+            "coverage": covered_weight / total if total else 0.0,
+            "local_accuracy": correct / covered_weight if covered_weight else 0.0,
+            "pipeline_accuracy": (correct + total - covered_weight) / total if total else 0.0,
+            "llm_calls_saved": round(covered_weight),
+        })
+    return report
+
+
+def print_report(report: dict):
+    print(f"Articles evaluated: {report['n_articles']} of {report['n_recorded']} recorded "
+          f"(local-path articles labelled: {report['local_path_labelled']})")
+    print(f"Local vs LLM route agreement (no threshold): {report['overall_accuracy']:.1%}\n")
+    print(f"{'threshold':>9} {'coverage':>9} {'local_acc':>9} {'pipeline':>9} {'saved':>6}")
+    for row in report["thresholds"]:
+        print(f"{row['threshold']:>9.2f} {row['coverage']:>9.1%} {row['local_accuracy']:>9.1%} "
+              f"{row['pipeline_accuracy']:>9.1%} {row['llm_calls_saved']:>6}")
+    print("\nConfusion (rows: LLM route, columns: local route)")
+    print(" " * 22 + " ".join(f"{r[:10]:>10}" for r in ROUTES))
+    for expected, counts in report["confusion"].items():
+        print(f"{expected:>22}" + " ".join(f"{counts[r]:>10}" for r in ROUTES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the local classifier against recorded LLM classifications.")
+    parser.add_argument("path", nargs="?", default=os.environ.get("CLASSIFIER_RECORD_PATH", "evaluation/recorded_articles.jsonl"))
+    parser.add_argument("--label-missing", action="store_true", help="Ask the LLM for articles recorded without a label.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    articles = load_recorded_articles(args.path)
+    if args.label_missing:
+        labelled = label_missing(articles)
+        if labelled:
+            save_labels(args.path, articles)
+        print(f"Labelled {labelled} articles with the LLM (saved to {args.path}).")
+
+    report = evaluate(articles, ClassifierAgent())
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from agents.classifier_agent import SEED_EXAMPLES
+from utils.embedding_service import BACKENDS, EmbeddingService
+
+
+def load_texts(path: str, limit: int) -> list:
+    """Recorded article texts (JSON lines with 'text'), topped up with the classifier seed examples."""
+    texts = []
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            texts = [json.loads(line)["text"] for line in f if line.strip()]
+    seeds = [text for examples in SEED_EXAMPLES.values() for text in examples]
+    # Numbered variants keep every text distinct, so uncached runs really encode each one
+    while len(texts) < limit:
+        texts.append(f"{seeds[len(texts) % len(seeds)]} ({len(texts)})")
+    return texts[:limit]
+
+
+def run_clients(encode_one, texts: list, clients: int) -> dict:
+    """Sends one text per request from `clients` concurrent callers; returns throughput and latency."""
+    latencies = [0.0] * len(texts)
+    vectors = [None] * len(texts)
+
+    def request(index):
+        started = time.perf_counter()
+        vectors[index] = encode_one(texts[index])
+        latencies[index] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(request, range(len(texts))))
+    elapsed = time.perf_counter() - started
+    return {
+        "texts_per_second": round(len(texts) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+        "vectors": np.vstack(vectors),
+    }
+
+
+def benchmark(texts: list, clients: int, backends: list, model_name: str) -> list:
+    """Current path (one full-precision encode call per request) against the shared service backends."""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    model.encode(texts[:8])
+
+    def direct(text):
+        embedding = np.asarray(model.encode([text]), dtype=np.float32)[0]
+        return embedding / max(np.linalg.norm(embedding), 1e-12)
+
+    baseline = run_clients(direct, texts, clients)
+    rows = [{"path": "direct torch (current)", **baseline}]
+    for backend in backends:
+        # No cache: every text is encoded, so rows compare inference and batching only
+        service = EmbeddingService(model_name, backend, cache_size=0)
+        if not service.available() or service.backend != backend:
+            print(f"Skipping {backend}: backend unavailable.")
+            continue
+        service.embed(texts[:8])
+        warmup_batches = service.stats["batches"]
+        rows.append({"path": f"service {backend}", **run_clients(service.embed_one, texts, clients),
+                     "batches": service.stats["batches"] - warmup_batches})
+
+    cached = EmbeddingService(model_name, backends[0] if backends else "torch")
+    cached.embed(texts)
+    rows.append({"path": f"service {cached.backend} (cached)", **run_clients(cached.embed_one, texts, clients)})
+
+    for row in rows:
+        vectors = row.pop("vectors")
+        # Agreement with the full-precision embeddings (1.0 = identical directions)
+        row["mean_cosine_vs_fp32"] = round(float(np.mean(np.sum(vectors * baseline["vectors"], axis=1))), 4)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU embedding throughput and latency per backend.")
+    parser.add_argument("--texts", default=os.environ.get("CLASSIFIER_RECORD_PATH", "evaluation/recorded_articles.jsonl"),
+                        help="JSON-lines file of {\"text\"} items (recorded articles by default).")
+    parser.add_argument("--count", type=int, default=512, help="Number of texts to embed.")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent single-text callers.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--model", default=os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'))
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    rows = benchmark(load_texts(args.texts, args.count), args.clients, args.backends, args.model)
+    if args.json:
+        print(json.dumps(rows, indent=4))
+    else:
+        print(f"{args.count} texts, {args.clients} concurrent clients, {os.cpu_count()} CPUs")
+        print(f"{'path':<28}{'texts/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'batches':>9}{'cos vs fp32':>13}")
+        for row in rows:
+            print(f"{row['path']:<28}{row['texts_per_second']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                  f"{row.get('batches', ''):>9}{row['mean_cosine_vs_fp32']:>13}")
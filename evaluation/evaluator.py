@@ -1,15 +1,30 @@
+import csv
+import json
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import ollama
 from openai import OpenAI
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+from utils.embedding_service import shared_embedder
+from utils.token_accounting import bind_context, estimate_tokens, note_degradation, record_usage, stage_allows
+
+SCORE_FIELDS = ("clarity", "accuracy", "rigor", "overall")
+
+# Regex fallback for graders that ignore the JSON instruction
+SCORE_PATTERNS = {
+    "clarity": r"clarity[:\s]*([0-9]+)\s*/\s*10",
+    "accuracy": r"accuracy[:\s]*([0-9]+)\s*/\s*10",
+    "rigor": r"rigor[:\s]*([0-9]+)\s*/\s*10",
+    "overall": r"overall.*?([0-9]+)\s*/\s*10"
+}
 
 class MultiAgentEvaluator:
     def __init__(self):
         self.openai_model = "gpt-4o"
         self.ollama_model = "llama2"
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        self.embedder = shared_embedder()
 
         # Initialize OpenAI client only if key is set
         api_key = os.getenv("OPENAI_API_KEY")
@@ -26,6 +41,19 @@ class MultiAgentEvaluator:
 
         print(f"Evaluator initialized in {self.mode.upper()} mode")
 
+    def _record_openai(self, prompt: str, response, started: float):
+        usage = getattr(response, "usage", None)
+        record_usage("MultiAgentEvaluator", "grading", self.openai_model, prompt, response.choices[0].message.content,
+                     input_tokens=getattr(usage, "prompt_tokens", None),
+                     output_tokens=getattr(usage, "completion_tokens", None),
+                     latency=time.perf_counter() - started)
+
+    def _record_ollama(self, prompt: str, response, started: float):
+        record_usage("MultiAgentEvaluator", "grading", self.ollama_model, prompt, response["message"]["content"],
+                     input_tokens=response.get("prompt_eval_count"),
+                     output_tokens=response.get("eval_count"),
+                     latency=time.perf_counter() - started)
+
     def llm_grade(self, thesis: str, reference: str = None) -> dict:
         """Evaluate investment thesis quality using OpenAI or Ollama."""
         prompt = f"""
@@ -42,11 +70,13 @@ class MultiAgentEvaluator:
         # --- Try OpenAI first ---
         if self.mode == "openai" and self.client is not None:
             try:
+                started = time.perf_counter()
                 response = self.client.chat.completions.create(
                     model=self.openai_model,
                     messages=[{"role": "user", "content": prompt}],
                     temperature=0.2,
                 )
+                self._record_openai(prompt, response, started)
                 return {"source": "openai", "raw": response.choices[0].message.content}
             except Exception as e:
                 print(f"[OpenAI Error] {e} — Falling back to Ollama.")
@@ -57,18 +87,166 @@ class MultiAgentEvaluator:
             return {"error": "Neither OpenAI nor Ollama available."}
 
         try:
+            started = time.perf_counter()
             response = ollama.chat(
                 model=self.ollama_model,
                 messages=[{"role": "user", "content": prompt}],
             )
+            self._record_ollama(prompt, response, started)
             return {"source": "ollama", "raw": response["message"]["content"]}
         except Exception as e:
             return {"error": f"Both evaluators failed: {e}"}
 
+    def llm_grade_structured(self, thesis: str, reference: str = None) -> dict:
+        """Grade a thesis and return integer scores parsed from a JSON response."""
+        prompt = f"""
+        Evaluate this investment thesis for clarity, factual accuracy, and rigor.
+        Respond only with a JSON object of the form
+        {{"clarity": int, "accuracy": int, "rigor": int, "overall": int, "summary": str}}
+        where every score is from 1-10 and the summary justifies the scores.
+
+        Thesis:
+        {thesis}
+
+        Reference (if provided):
+        {reference}
+        """
+        raw, source = None, None
+
+        if not stage_allows("grading", estimate_tokens(prompt) + 300):
+            note_degradation("grading", "skipped grading", "grading budget exhausted")
+            scores = {key: 0 for key in SCORE_FIELDS}
+            return {**scores, "source": "skipped", "evaluation_summary": "Skipped: token budget exhausted."}
+
+        if self.mode == "openai" and self.client is not None:
+            try:
+                started = time.perf_counter()
+                response = self.client.chat.completions.create(
+                    model=self.openai_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.2,
+                    response_format={"type": "json_object"},
+                )
+                self._record_openai(prompt, response, started)
+                raw, source = response.choices[0].message.content, "openai"
+            except Exception as e:
+                print(f"[OpenAI Error] {e} — Falling back to Ollama.")
+                self.mode = "ollama"
+
+        if raw is None:
+            try:
+                started = time.perf_counter()
+                response = ollama.chat(
+                    model=self.ollama_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    format="json",
+                )
+                self._record_ollama(prompt, response, started)
+                raw, source = response["message"]["content"], "ollama"
+            except Exception as e:
+                scores = {key: 0 for key in SCORE_FIELDS}
+                return {**scores, "source": "unknown", "evaluation_summary": f"Both evaluators failed: {e}"}
+
+        return {**self.parse_scores(raw), "source": source}
+
+    @staticmethod
+    def parse_scores(raw: str) -> dict:
+        """Parse grader output into scores, accepting JSON or the free-text 'x/10' format."""
+        scores = {key: 0 for key in SCORE_FIELDS}
+        summary = raw or ""
+        try:
+            parsed = json.loads(raw)
+            for key in SCORE_FIELDS:
+                scores[key] = int(parsed.get(key, 0))
+            summary = parsed.get("summary", summary)
+        except (TypeError, ValueError, AttributeError):
+            for key, pattern in SCORE_PATTERNS.items():
+                match = re.search(pattern, summary, re.IGNORECASE)
+                if match:
+                    scores[key] = int(match.group(1))
+        return {**scores, "evaluation_summary": summary}
+
+    def batch_grade(self, theses: list, references: list = None, max_workers: int = 4) -> list:
+        """Grade many theses concurrently; results are returned in input order."""
+        references = references or [None] * len(theses)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(bind_context(self.llm_grade_structured), theses, references))
+
+    def embed(self, texts: list) -> np.ndarray:
+        """L2-normalized embeddings from the shared service (micro-batched, cached by text hash)."""
+        return self.embedder.embed(list(texts))
+
     def embedding_consistency(self, thesis_a: str, thesis_b: str) -> float:
         """Measure semantic similarity between two analyses."""
-        embeddings = self.embedder.encode([thesis_a, thesis_b])
-        return cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
+        embeddings = self.embed([thesis_a, thesis_b])
+        return float(embeddings[0] @ embeddings[1])
+
+    def similarity_matrix(self, theses: list) -> np.ndarray:
+        """Pairwise cosine similarity of N theses as an N x N matrix."""
+        embeddings = self.embed(theses)
+        return embeddings @ embeddings.T
+
+    def history_drift(self, symbols: list, theses: list, history: dict) -> np.ndarray:
+        """Drift (1 - mean cosine similarity) of each thesis against its symbol's stored theses.
+
+        `history` maps symbol -> stored text, list of texts, or a MemoryAgent entry with a
+        'summary'. Symbols without history get NaN.
+        """
+        thesis_emb = self.embed(theses)
+        owners, texts = [], []
+        for i, symbol in enumerate(symbols):
+            entries = history.get(symbol) or []
+            if isinstance(entries, (str, dict)):
+                entries = [entries]
+            for entry in entries:
+                text = entry.get("summary") if isinstance(entry, dict) else entry
+                if text:
+                    owners.append(i)
+                    texts.append(text)
+
+        drift = np.full(len(theses), np.nan, dtype=np.float32)
+        if not texts:
+            return drift
+        owners = np.asarray(owners)
+        history_emb = self.embed(texts)
+        similarities = np.einsum("ij,ij->i", history_emb, thesis_emb[owners])
+        counts = np.bincount(owners, minlength=len(theses))
+        sums = np.bincount(owners, weights=similarities, minlength=len(theses))
+        has_history = counts > 0
+        drift[has_history] = 1.0 - sums[has_history] / counts[has_history]
+        return drift
+
+    def evaluate_batch(self, items: list, history: dict = None, out_path: str = None,
+                       max_workers: int = 4) -> list:
+        """Grade and compare a batch of {"symbol", "thesis"} items and optionally write a CSV score table."""
+        symbols = [item["symbol"] for item in items]
+        theses = [item["thesis"] or "" for item in items]
+        if not theses:
+            return []
+
+        grades = self.batch_grade(theses, max_workers=max_workers)
+        similarities = self.similarity_matrix(theses)
+        n = len(theses)
+        peer_similarity = ((similarities.sum(axis=1) - np.diag(similarities)) / (n - 1)
+                           if n > 1 else np.full(n, np.nan))
+        drift = self.history_drift(symbols, theses, history or {})
+
+        table = []
+        for i, symbol in enumerate(symbols):
+            row = {"symbol": symbol}
+            row.update({key: grades[i][key] for key in SCORE_FIELDS})
+            row["source"] = grades[i]["source"]
+            row["peer_similarity"] = round(float(peer_similarity[i]), 4)
+            row["history_drift"] = round(float(drift[i]), 4)
+            table.append(row)
+
+        if out_path:
+            with open(out_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(table[0].keys()))
+                writer.writeheader()
+                writer.writerows(table)
+            print(f"Score table written to {out_path}")
+        return table
 
     def coordination_efficiency(self, logs: list) -> dict:
         """Analyze inter-agent message structure."""
@@ -1,6 +1,9 @@
+import argparse
 import json
 import os
-import re
+from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from agents.toolbox_agent import ToolboxAgent
 from agents.planning_agent import PlanningAgent
@@ -9,178 +12,356 @@ from agents.evaluator_optimizer_agent import EvaluatorOptimizerAgent
 from agents.prompt_chaining_agent import PromptChainingAgent
 from agents.routing_agent import RoutingAgent
 from evaluation.evaluator import MultiAgentEvaluator
+from utils.article_store import ArticleStore, article_id
+from utils.blob_store import materialize
+from utils.profiler import StageProfiler, profiled
+from utils.run_state import RunState
+from utils.scheduler import DataflowScheduler
+from utils.token_accounting import TokenLedger, bind_context, use_ledger
 from utils.utils import load_env
 
-def run_analysis(symbol: str):
-    """Runs the full agentic analysis for a given stock symbol."""
+# Per-stage timeouts in seconds (None means no limit)
+STAGE_TIMEOUTS = {
+    "memory": 30,
+    "plan": 120,
+    "tool": 180,
+    "news_chain": 600,
+    "draft": 900,
+    "thesis": 900,
+    "grade": 300,
+    "memory_update": 30,
+}
+
+def create_agents(grader: bool = False, tool_cache_seconds: float = None) -> dict:
+    """Initializes the agents; a long-running process (e.g. service.py) creates them once and reuses them."""
+    return {
+        "toolbox": ToolboxAgent(cache_seconds=tool_cache_seconds),
+        "memory": MemoryAgent(),
+        "planner": PlanningAgent(),
+        "prompt_chainer": PromptChainingAgent(),
+        "router": RoutingAgent(),
+        "evaluator": EvaluatorOptimizerAgent(),
+        "article_store": ArticleStore(),
+        "grader": MultiAgentEvaluator() if grader else None,
+    }
+
+
+# Background refreshes of stale theses, at most one per symbol (they outlive Streamlit reruns)
+_refreshes = {}
+_refresh_lock = threading.Lock()
+_refresh_pool = None
+
+
+def refresh_in_background(symbol: str, agents: dict = None):
+    """Starts a background run for symbol, or returns the one already in flight; its result lands in memory."""
+    global _refresh_pool
+    with _refresh_lock:
+        future = _refreshes.get(symbol)
+        if future is None or future.done():
+            if _refresh_pool is None:
+                _refresh_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('THESIS_REFRESH_WORKERS', 2)),
+                                                   thread_name_prefix="refresh")
+            future = _refresh_pool.submit(run_analysis, symbol, agents)
+            _refreshes[symbol] = future
+        return future
+
+
+def is_refreshing(symbol: str) -> bool:
+    with _refresh_lock:
+        future = _refreshes.get(symbol)
+        return future is not None and not future.done()
+
+
+def cached_analysis(symbol: str, agents: dict = None, refresh: bool = True) -> RunState:
+    """Stale-while-revalidate: the stored thesis if it is recent enough, else None.
+
+    Within THESIS_FRESH_SECONDS the stored thesis is returned as is. Up to THESIS_MAX_STALE_SECONDS
+    it is still returned immediately, and (with refresh) a background refresh replaces it in memory
+    when done. Older (or missing) theses return None so the caller runs the pipeline.
+    """
+    memory = (agents or {}).get("memory") or MemoryAgent()
+    entry = memory.retrieve(symbol)
+    if not entry or not entry.get("summary"):
+        return None
+    try:
+        age = (datetime.now() - datetime.fromisoformat(entry["date"])).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if age > float(os.environ.get('THESIS_MAX_STALE_SECONDS', 7 * 24 * 3600)):
+        return None
+
+    stale = age > float(os.environ.get('THESIS_FRESH_SECONDS', 6 * 3600))
+    if stale and refresh:
+        refresh_in_background(symbol, agents)
+    state = RunState(symbol)
+    state["last_run"] = entry["date"]
+    state["final_thesis"] = entry["summary"]
+    state["evaluation"] = entry.get("evaluation")
+    state["thesis_sources"] = entry.get("thesis_sources") or {}
+    state["freshness"] = {"source": "memory", "as_of": entry["date"], "age_seconds": round(age, 1),
+                          "stale": stale, "refreshing": is_refreshing(symbol)}
+    return state
+
+
+def run_analysis(symbol: str, agents: dict = None, profiler: StageProfiler = None, serve_cached: bool = False):
+    """Runs the full agentic analysis for a given stock symbol (with warm agents if given).
+
+    With a profiler, every stage is CPU- and memory-profiled (see utils/profiler.py).
+    With serve_cached, a recent stored thesis is returned instead (see cached_analysis).
+    """
     
     # Load API keys and configure Gemini
     load_env()
+    if serve_cached:
+        cached = cached_analysis(symbol, agents)
+        if cached is not None:
+            print(f"--- Serving stored thesis for {symbol} ({cached['freshness']['age_seconds']:.0f}s old"
+                  f"{', refreshing in background' if cached['freshness']['stale'] else ''}) ---")
+            return cached
     genai.configure(api_key=os.environ.get('GOOGLE_API_KEY'))
 
     # 1. Initialize Agents
-    toolbox = ToolboxAgent()
-    memory = MemoryAgent()
-    planner = PlanningAgent()
-    prompt_chainer = PromptChainingAgent()
-    router = RoutingAgent()
-    evaluator = EvaluatorOptimizerAgent()
-
-    # 2. Define State
-    state = {
-        "symbol": symbol,
-        "plan": [],
-        "raw_data": {},
-        "processed_news": [],
-        "conversational_logs": [],
-        "final_thesis": None
-    }
+    agents = agents or create_agents()
+    toolbox = agents["toolbox"]
+    memory = agents["memory"]
+    planner = agents["planner"]
+    prompt_chainer = agents["prompt_chainer"]
+    router = agents["router"]
+    evaluator = agents["evaluator"]
+    article_store = agents["article_store"]
+
+    # 2. Define State (large raw data is spilled to disk and referenced by handle)
+    state = RunState(symbol)
+    state["freshness"] = {"source": "live", "age_seconds": 0.0, "stale": False, "refreshing": False}
 
     print(f"--- Starting Analysis for {symbol} ---")
 
-    # 3. Establish Flow
-    # Input Symbol -> Memory Agent -> Planning Engine Agent
-    retrieved_memory = memory.retrieve(symbol, state)
-    if retrieved_memory:
-        print(f"\n--- Retrieved Memory for {symbol} ---")
-        print(json.dumps(retrieved_memory, indent=4))
-    
-    state["plan"] = planner.generate_plan(symbol, state, json.dumps(retrieved_memory) if retrieved_memory else None)
-    if not state["plan"]:
-        print("Could not generate a plan. Exiting.")
-        return
+    # 3. Establish Flow as a dependency graph; each stage starts as soon as its inputs are ready
+    scheduler = DataflowScheduler(max_workers=int(os.environ.get('PIPELINE_MAX_WORKERS', 8)), name=symbol,
+                                  profiler=profiler)
+    # Tool outputs that feed the early draft and those folded in later by the delta update
+    early_sources, late_sources = [], []
+
+    # Input Symbol -> Memory Agent
+    def retrieve_memory(inputs):
+        retrieved_memory = memory.retrieve(symbol, state)
+        state["last_run"] = (retrieved_memory or {}).get('date')
+        if retrieved_memory:
+            print(f"\n--- Retrieved Memory for {symbol} ---")
+            print(json.dumps(retrieved_memory, indent=4))
+        return retrieved_memory
+
+    # Memory Agent -> Planning Engine Agent, which expands the graph with the planned tool calls
+    def plan(inputs):
+        state["plan"] = planner.generate_plan(symbol, state, inputs["memory"])
+        if not state["plan"]:
+            print("Could not generate a plan. Exiting.")
+            return []
+
+        print(f"\n--- Generated Plan for {symbol} ---")
+        for step in state["plan"]:
+            after = f" after {', '.join(step['depends_on'])}" if step["depends_on"] else ""
+            print(f"- [{step['id']}] {step['tool']}({step['args']}){after}: {step.get('reason', '')}")
+
+        # Slow sources (filings, macro) can be folded into an early draft later instead of gating it
+        speculative = os.environ.get('SPECULATIVE_THESIS', 'true').lower() == 'true'
+        late_tools = {tool.strip() for tool in os.environ.get('SPECULATIVE_LATE_TOOLS', 'secEdgar,fred').split(',')}
+        early_deps, late_deps, news_deps = [], [], []
+        for step in state["plan"]:
+            node = f"tool:{step['id']}"
+            scheduler.add_node(node, fetch_step(step), deps=["plan"] + [f"tool:{d}" for d in step["depends_on"]],
+                               timeout=STAGE_TIMEOUTS["tool"])
+            if profiler:
+                profiler.describe(node, f"{step['tool']}({', '.join(step['args'].values())})")
+            deps, sources = (late_deps, late_sources) if step["tool"] in late_tools else (early_deps, early_sources)
+            deps.append(node)
+            if step["output"] not in sources:
+                sources.append(step["output"])
+            if step["tool"] == "newsapi":
+                news_deps.append(node)
+        # One chain over every news output, however many newsapi steps the plan has
+        if news_deps:
+            scheduler.add_node("news_chain", chain_news, deps=news_deps, timeout=STAGE_TIMEOUTS["news_chain"])
+            early_deps.append("news_chain")
 
-    print(f"\n--- Generated Plan for {symbol} ---")
-    for step in state["plan"]:
-        print(f"- {step}")
-
-    # The sequence then calls the Toolbox Agent multiple times
-    for step in state["plan"]:
-        if ("assessment" in step.lower() or "analysis" in step.lower()) and 'yfinance' not in state["raw_data"]:
-            state["raw_data"]['yfinance'] = toolbox.fetch('yfinance', symbol, state)
-        if ("news" in step.lower() or "finding" in step.lower() or "analysis" in step.lower()) and 'news' not in state["raw_data"]:
-            state["raw_data"]['news'] = toolbox.fetch('newsapi', symbol, state)
-        if ("economic" in step.lower() or "advancements" in step.lower()) and 'fred_gdp' not in state["raw_data"]:
-            # A more robust implementation would parse the indicator
-            state["raw_data"]['fred_gdp'] = toolbox.fetch('fred', 'GDP', state)
-        if ("valuation" in step.lower() or "risk" in step.lower() or "report" in step.lower()) and "secEdgar" not in state["raw_data"]:
-            # A more robust implementation would parse the indicator
-            state["raw_data"]['secEdgar'] = toolbox.fetch('secEdgar', symbol, state)
-
-    print("\n--- Fetched Raw Data ---")
-    # Abridged printing for brevity
-    if 'yfinance' in state["raw_data"]:
-        print("  - Yahoo Finance data retrieved.")
-    if 'news' in state["raw_data"]:
-        print("  - News data retrieved.")
-    if 'fred_gdp' in state["raw_data"]:
-        print("  - FRED GDP data retrieved.")
-    if 'secEdgar' in state["raw_data"]:
-        print("  - Sec Edgar data retrieved.")
+        if speculative and early_deps and late_deps:
+            scheduler.add_node("draft", generate_draft, deps=early_deps, timeout=STAGE_TIMEOUTS["draft"])
+            scheduler.add_node("thesis", update_thesis, deps=["draft"] + late_deps, timeout=STAGE_TIMEOUTS["thesis"])
+        else:
+            scheduler.add_node("thesis", generate_thesis, deps=early_deps + late_deps, timeout=STAGE_TIMEOUTS["thesis"])
+        return state["plan"]
+
+    # Planning -> Toolbox Agent, once per planned tool invocation
+    def fetch_step(step):
+        def fetch(inputs):
+            # News is only fetched from the last run onwards; older articles come from the article store
+            since = state["last_run"] if step["tool"] == "newsapi" else None
+            # This step's own data; another step with the same output key may overwrite raw_data meanwhile
+            data = state.set_raw(step["output"], toolbox.invoke(step, state, since=since))
+            print(f"  - {step['output']} data {'retrieved' if data else 'unavailable'}.")
+            return data
+        return fetch
 
     # Toolbox Output -> Prompt Chaining Agent -> Routing Agent
-    if 'news' in state["raw_data"] and state["raw_data"]['news']!=None and state["raw_data"]['news']['articles']:
-        for article in state["raw_data"]['news']['articles']:
-            processed_article = prompt_chainer.run(article['title'] + "\n" + article.get('description', ''), state)
+    def chain_news(inputs):
+        # Articles of all news outputs, each article once (by URL + content hash)
+        articles = {}
+        for news in inputs.values():
+            for article in (news or {}).get('articles') or []:
+                articles.setdefault(article_id(article), article)
+        keys, articles = list(articles), list(articles.values())
+
+        # Only articles not seen before go through the LLM chain
+        stored = [article_store.get(key) for key in keys]
+        new_articles = [article for article, known in zip(articles, stored) if known is None]
+        print(f"\n--- News: {len(articles)} fetched, {len(new_articles)} new, {len(articles) - len(new_articles)} reused ---")
+        with ThreadPoolExecutor(max_workers=int(os.environ.get('ARTICLE_WORKERS', 4))) as pool:
+            fresh = iter(pool.map(
+                bind_context(profiled(lambda article: prompt_chainer.run(article['title'] + "\n" + (article.get('description') or ''), state))),
+                new_articles))
+
+        for article, key, known in zip(articles, keys, stored):
+            processed_article = dict(known) if known is not None else next(fresh)
+
+            # The local classifier already yields a route label; otherwise route the LLM classification
+            route = router.route(processed_article.get('route') or processed_article.get('classification', ''), state)
+            processed_article["route"] = route
             state["processed_news"].append(processed_article)
-            
-            state["classification"] = router.route(processed_article.get('classification', ''), state)
+            state["classification"] = route
+            if known is None and "error" not in processed_article:
+                article_store.put(key, symbol, article, processed_article)
+            elif known is not None:
+                article_store.add_symbol(key, symbol)
 
-            print(f"\n--- Routing for article: '{article['title']}' ---")
+            print(f"\n--- Routing for article: '{article['title']}' {'(reused)' if known else ''}---")
             print(f"  - Classification: {processed_article.get('classification')}")
-            print(f"  - Route: {state["classification"]}")
+            print(f"  - Route: {route}")
 
             # Routing -> Execution of Specialized Model (Placeholder)
-            if state["classification"] == 'EarningsModelRun':
+            if route == 'EarningsModelRun':
                 print("  - (Placeholder) Would run a discounted cash flow model here.")
-            elif state["classification"] == 'ComplianceCheck':
+            elif route == 'ComplianceCheck':
                 print("  - (Placeholder) Would run a regulatory impact model here.")
             else:
                 print("  - (Placeholder) Would run a general analysis model here.")
 
-    # All data -> Evaluator–Optimizer Agent
-    print("\n--- Generating Final Thesis with Evaluator-Optimizer ---")
-
-    # Ensure yfinance data exists and is a non-empty list
-    #yfinance_data = state.get("raw_data", {}).get("yfinance", [])
-
-    #if yfinance_data and isinstance(yfinance_data, list):
-    #    financial_data = yfinance_data[0]  # first (and usually only) entry
-    #else:
-    #    financial_data = {}
-
-    # Collect all relevant structured data for evaluation
-    evaluator_data = {
-        "symbol": state.get("symbol"),
-        "classification": state.get("classification"),
-        "financials": state.get("raw_data", {}).get("yfinance", []),
-        "news": state.get("processed_news"),
-        "economics": state.get("raw_data", {}).get("fred_gdp", []),
-        "filings": state.get("raw_data", {}).get("secEdgar", [])
-    }
+        # Articles processed on earlier runs keep informing the thesis
+        context_limit = int(os.environ.get('ARTICLE_CONTEXT_LIMIT', 10))
+        state["processed_news"].extend(
+            article_store.recent(symbol, limit=max(0, context_limit - len(articles)), exclude=set(keys)))
+        return state["processed_news"]
 
-    state["final_thesis"] = evaluator.run(evaluator_data, state)
+    # Collect the structured data of the given tool outputs for evaluation
+    def collect_data(sources):
+        raw_data = state.get("raw_data", {})
+        evaluator_data = {"symbol": state.get("symbol"), "classification": state.get("classification")}
+        if "yfinance" in sources:
+            evaluator_data["financials"] = raw_data.get("yfinance", [])
+        if "technicals" in sources:
+            evaluator_data["technicals"] = raw_data.get("technicals", {})
+        if "news" in sources:
+            evaluator_data["news"] = state.get("processed_news")
+        economics = {key[len("fred_"):].upper(): raw_data.get(key) for key in sources if key.startswith("fred_")}
+        if economics:
+            evaluator_data["economics"] = economics
+        if "secEdgar" in sources:
+            evaluator_data["filings"] = raw_data.get("secEdgar", [])
+        # Blob handles are only read back here, right before the prompt is built
+        return materialize(evaluator_data)
 
-    final_thesis = state["final_thesis"]
-    logs = state.get("conversation_logs", [])
+    def available(sources):
+        return [source for source in sources
+                if (state["processed_news"] if source == "news" else state["raw_data"].get(source))]
 
-    evaluator = MultiAgentEvaluator()
+    def record_sources(sources, how):
+        for source in sources:
+            state["thesis_sources"][source] = how if source in available([source]) else "unavailable"
 
-    # LLM-based evaluation
-    eval_result = evaluator.llm_grade(final_thesis)
-    # Coordination metrics
-    coordination = evaluator.coordination_efficiency(logs)
+    # All data -> Evaluator–Optimizer Agent
+    def generate_thesis(inputs):
+        print("\n--- Generating Final Thesis with Evaluator-Optimizer ---")
+        sources = early_sources + late_sources
+        state["final_thesis"] = evaluator.run(collect_data(sources), state)
+        record_sources(sources, "thesis")
+        return state["final_thesis"]
 
-    # Basic heuristic parsing of scores from LLM text
-    eval_text = eval_result.get("raw", "")
-    clarity = accuracy = rigor = overall = 0
+    # Speculative mode: fundamentals, technicals and news -> early draft, while filings/macro are still loading
+    def generate_draft(inputs):
+        print(f"\n--- Drafting Thesis from Early Sources ({', '.join(early_sources)}) ---")
+        draft = evaluator.run(collect_data(early_sources), state)
+        record_sources(early_sources, "draft")
+        return draft
 
-    # Regex patterns to extract scores
-    patterns = {
-        "clarity": r"clarity[:\s]*([0-9]+)\s*/\s*10",
-        "accuracy": r"accuracy[:\s]*([0-9]+)\s*/\s*10",
-        "rigor": r"rigor[:\s]*([0-9]+)\s*/\s*10",
-        "overall": r"overall.*?([0-9]+)\s*/\s*10"
-    }
-    
-    # Extract scores
-    for key, pattern in patterns.items():
-        match = re.search(pattern, eval_text, re.IGNORECASE)
-        if match:
-            score = int(match.group(1))
-            if key == "clarity":
-                clarity = score
-            elif key == "accuracy":
-                accuracy = score
-            elif key == "rigor":
-                rigor = score
-            elif key == "overall":
-                overall = score
-
-    eval_metrics = {
-        "clarity": clarity,
-        "accuracy": accuracy,
-        "rigor": rigor,
-        "overall": overall,
-        "source": eval_result.get("source", "unknown"),
-        "evaluation_summary": eval_text,
-    }
+    # Late sources -> delta update of only the affected parts of the draft
+    def update_thesis(inputs):
+        draft = inputs.get("draft")
+        if not draft:
+            return generate_thesis(inputs)
+
+        arrived = available(late_sources)
+        state["final_thesis"] = draft
+        if arrived:
+            print(f"\n--- Updating Draft with Late Sources ({', '.join(arrived)}) ---")
+            late_data = {key: value for key, value in collect_data(arrived).items()
+                         if key not in ("symbol", "classification")}
+            state["final_thesis"], incorporated = evaluator.revise(draft, late_data, state)
+            record_sources(arrived, "delta" if incorporated else "not incorporated")
+        record_sources([source for source in late_sources if source not in arrived], "unavailable")
+        return state["final_thesis"]
+
+    # Final thesis -> Grader
+    def grade(inputs):
+        if not inputs["thesis"]:
+            print("\n--- No thesis generated; skipping evaluation ---")
+            return None
+        grader = agents.get("grader") or MultiAgentEvaluator()
+        logs = state.get("conversation_logs", [])
 
-    state["evaluation"] = eval_metrics
+        # LLM-based evaluation with structured JSON scores
+        eval_metrics = grader.llm_grade_structured(inputs["thesis"])
+        # Coordination metrics
+        coordination = grader.coordination_efficiency(logs)
 
-    print("\n--- Evaluation Metrics ---")
-    print(eval_metrics)
+        state["evaluation"] = eval_metrics
 
-    memory.update(symbol, state["evaluation"])
+        print("\n--- Evaluation Metrics ---")
+        print(eval_metrics)
+        return eval_metrics
 
     # Evaluator–Optimizer Output -> Memory Agent (Update)
-    if state["final_thesis"]:
-        # A more robust implementation would extract key metrics from the thesis
-        memory.update(symbol, {"summary": state["final_thesis"]}, state)
+    def update_memory(inputs):
+        # A failed or timed-out thesis never replaces the stored one that cached runs serve
+        if not inputs["thesis"]:
+            print(" No valid thesis; memory not updated.")
+            return
+        # Sector and headline metrics let the planner reuse sector plan templates on later runs
+        info = state["raw_data"].get("yfinance") or {}
+        key_metrics = {key: info.get(key) for key in ("sector", "industry", "currentPrice", "marketCap", "trailingPE")
+                       if info.get(key) is not None}
+        memory.update(symbol, {"summary": inputs["thesis"], "key_metrics": key_metrics,
+                               "evaluation": inputs["grade"], "thesis_sources": state["thesis_sources"]}, state)
+
+    scheduler.add_node("memory", retrieve_memory, timeout=STAGE_TIMEOUTS["memory"])
+    scheduler.add_node("plan", plan, deps=["memory"], timeout=STAGE_TIMEOUTS["plan"])
+    scheduler.add_node("grade", grade, deps=["thesis"], timeout=STAGE_TIMEOUTS["grade"])
+    scheduler.add_node("memory_update", update_memory, deps=["thesis", "grade"], timeout=STAGE_TIMEOUTS["memory_update"])
+    # Every LLM call in the run is accounted (and budgeted) on this run's ledger
+    ledger = TokenLedger()
+    with use_ledger(ledger, symbol):
+        results = scheduler.run()
+    # A thesis node that timed out may still write its late result to the state; only the graph's result counts
+    state["final_thesis"] = results.get("thesis")
+    state["timings"] = scheduler.print_timing_report()
+    state["usage"] = ledger.print_summary()
+
+    if not state["plan"]:
+        return
 
+    if state["final_thesis"]:
         print(f"\n--- Completed Analysis for {symbol} ---")
         print("Final Thesis:")
         print(state["final_thesis"])
+        print("Sources incorporated: " + ", ".join(f"{source} ({how})" for source, how in state["thesis_sources"].items()))
     
         return state
 
@@ -189,10 +370,35 @@ def run_analysis(symbol: str):
 
 	
 if __name__ == "__main__":
-    # Prompt user for input with default value
-    user_input = input("Enter stock symbol [default: NVDA]: ").strip()
-    
-    # Use NVDA if no input is provided
-    symbol = user_input.upper() if user_input else "NVDA"
-    
-    run_analysis(symbol)
+    parser = argparse.ArgumentParser(description="Run the multi-agent investment analysis for a stock symbol.")
+    parser.add_argument("symbol", nargs="?", help="Stock symbol (prompted for if omitted).")
+    parser.add_argument("--profile", nargs="?", const="profiles", metavar="DIR",
+                        help="Profile CPU and memory per stage and write a report under DIR (default: profiles).")
+    parser.add_argument("--profile-top", type=int, default=None, help="Hot functions / allocation sites per stage.")
+    parser.add_argument("--profile-collapsed", action="store_true", help="Also dump collapsed stacks for flamegraphs.")
+    parser.add_argument("--cached", action="store_true",
+                        help="Print the stored thesis if it is fresh enough (stale ones are refreshed before exiting).")
+    args = parser.parse_args()
+
+    if args.symbol:
+        symbol = args.symbol.upper()
+    else:
+        # Prompt user for input with default value
+        user_input = input("Enter stock symbol [default: NVDA]: ").strip()
+
+        # Use NVDA if no input is provided
+        symbol = user_input.upper() if user_input else "NVDA"
+
+    if args.profile:
+        out_dir = os.path.join(args.profile, f"{symbol}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        with StageProfiler(out_dir, top_n=args.profile_top, collapsed=args.profile_collapsed) as profiler:
+            run_analysis(symbol, profiler=profiler)
+    elif args.cached:
+        result = run_analysis(symbol, serve_cached=True)
+        if result is not None and not isinstance(result, str) and result["freshness"]["source"] == "memory":
+            print(result["final_thesis"])
+            print(f"Evaluation: {result['evaluation']}")
+            if result["freshness"]["stale"]:
+                refresh_in_background(symbol).result()
+    else:
+        run_analysis(symbol)
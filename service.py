@@ -0,0 +1,182 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from main import create_agents, run_analysis
+from utils.utils import load_env
+
+SYMBOL_PATTERN = re.compile(r"^[A-Za-z0-9.\-^]{1,12}$")
+
+# Fields of the run state returned by the result endpoint (raw data and logs stay server-side)
+RESULT_FIELDS = ("symbol", "final_thesis", "evaluation", "thesis_sources", "classification", "plan", "timings", "usage")
+
+
+def result_payload(state) -> dict:
+    if state is None or isinstance(state, str):
+        return {"error": state or "Could not generate a plan."}
+    return {field: state.get(field) for field in RESULT_FIELDS}
+
+
+class AnalysisService:
+    """Runs analyses with warm agents, one in-flight run per symbol, and recent results kept in memory.
+
+    Concurrent submissions for a symbol that is already running join that run (single-flight);
+    a symbol analyzed within the freshness window is answered from memory without a new run.
+    """
+
+    def __init__(self, max_concurrent: int = None, freshness_seconds: float = None, max_jobs: int = None):
+        self.freshness_seconds = float(freshness_seconds if freshness_seconds is not None
+                                       else os.environ.get('SERVICE_FRESHNESS_SECONDS', 900))
+        self.max_jobs = int(max_jobs or os.environ.get('SERVICE_MAX_JOBS', 1000))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(max_concurrent or os.environ.get('SERVICE_MAX_CONCURRENT', 4)), thread_name_prefix="analysis")
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = OrderedDict()
+        self.inflight = {}
+        self.latest = {}
+        # Warm agents reuse fetched tool data only within the freshness window, so a new run sees new data
+        self.agents = create_agents(grader=True, tool_cache_seconds=self.freshness_seconds)
+
+    def _is_fresh(self, job: dict, max_age: float) -> bool:
+        return job["status"] == "done" and time.time() - job["finished_at"] <= max_age
+
+    def submit(self, symbol: str, max_age: float = None, force: bool = False) -> dict:
+        """Returns the job answering this request: a fresh result, the in-flight run, or a new run."""
+        symbol = symbol.upper()
+        max_age = self.freshness_seconds if max_age is None else max_age
+        with self.lock:
+            latest = self.latest.get(symbol)
+            if not force and latest and self._is_fresh(latest, max_age):
+                latest["served_from_cache"] += 1
+                return latest
+            if symbol in self.inflight:
+                job = self.inflight[symbol]
+                job["coalesced"] += 1
+                return job
+
+            job = {"id": str(next(self.ids)), "symbol": symbol, "status": "queued", "submitted_at": time.time(),
+                   "started_at": None, "finished_at": None, "coalesced": 0, "served_from_cache": 0,
+                   "error": None, "result": None}
+            self.jobs[job["id"]] = job
+            self.inflight[symbol] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: dict):
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        try:
+            result = result_payload(run_analysis(job["symbol"], self.agents))
+            job["result"] = result
+            job["error"] = result.get("error")
+            job["status"] = "failed" if job["error"] else "done"
+        except Exception as e:
+            traceback.print_exc()
+            job["status"], job["error"] = "failed", str(e)
+        job["finished_at"] = time.time()
+        with self.lock:
+            self.inflight.pop(job["symbol"], None)
+            if job["status"] == "done":
+                self.latest[job["symbol"]] = job
+
+    def get(self, job_id: str) -> dict:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    @staticmethod
+    def status(job: dict) -> dict:
+        now = time.time()
+        return {
+            "id": job["id"],
+            "symbol": job["symbol"],
+            "status": job["status"],
+            "coalesced_requests": job["coalesced"],
+            "served_from_cache": job["served_from_cache"],
+            "age_seconds": round(now - job["finished_at"], 1) if job["finished_at"] else None,
+            "elapsed_seconds": round((job["finished_at"] or now) - job["started_at"], 1) if job["started_at"] else None,
+            "error": job["error"],
+        }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """POST /analyses, GET /analyses/<id>, GET /analyses/<id>/result, GET /health."""
+
+    service: AnalysisService = None
+
+    def _send(self, code: int, body: dict):
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if parts == ["health"]:
+            with self.service.lock:
+                inflight = list(self.service.inflight)
+            return self._send(200, {"status": "ok", "inflight": inflight})
+        if len(parts) in (2, 3) and parts[0] == "analyses":
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send(404, {"error": f"Unknown analysis id {parts[1]}"})
+            if len(parts) == 2:
+                return self._send(200, self.service.status(job))
+            if parts[2] == "result":
+                if job["status"] in ("queued", "running"):
+                    return self._send(409, {**self.service.status(job), "error": "Analysis not finished yet"})
+                return self._send(200, {**self.service.status(job), "result": job["result"]})
+        self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/analyses":
+            return self._send(404, {"error": f"Unknown path {self.path}"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+            symbol = str(body.get("symbol", "")).strip()
+            max_age = float(body["max_age"]) if body.get("max_age") is not None else None
+        except (ValueError, TypeError) as e:
+            return self._send(400, {"error": f"Invalid request body: {e}"})
+        if not SYMBOL_PATTERN.match(symbol):
+            return self._send(400, {"error": "A valid 'symbol' is required"})
+
+        job = self.service.submit(symbol, max_age=max_age, force=bool(body.get("force")))
+        status = self.service.status(job)
+        if job["status"] == "done":
+            return self._send(200, {**status, "result": job["result"]})
+        self._send(202, status)
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} {format % args}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP service around run_analysis with warm agents.")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    load_env()
+    ServiceHandler.service = AnalysisService()
+    host = args.host or os.environ.get('SERVICE_HOST', '127.0.0.1')
+    port = args.port or int(os.environ.get('SERVICE_PORT', 8080))
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"Analysis service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
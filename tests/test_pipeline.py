@@ -0,0 +1,61 @@
+import importlib.util
+import sys
+from unittest import mock
+
+# The pipeline graph is exercised with fake agents; SDKs missing from the test environment are stubbed
+for module in ("google", "google.generativeai", "newsapi", "fredapi", "sec_api", "yfinance", "requests",
+               "ollama", "openai"):
+    try:
+        missing = importlib.util.find_spec(module) is None
+    except ModuleNotFoundError:
+        missing = True
+    if missing:
+        sys.modules[module] = mock.MagicMock()
+
+import main  # noqa: E402
+
+
+def news_step(step_id, symbol):
+    return {"id": step_id, "tool": "newsapi", "args": {"symbol": symbol}, "depends_on": [], "output": "news",
+            "reason": ""}
+
+
+def fake_agents(plan, articles):
+    toolbox = mock.MagicMock()
+    toolbox.invoke.side_effect = lambda step, state, since=None: {"articles": articles[step["args"]["symbol"]]}
+    planner = mock.MagicMock()
+    planner.generate_plan.return_value = plan
+    memory = mock.MagicMock()
+    memory.retrieve.return_value = None
+    prompt_chainer = mock.MagicMock()
+    prompt_chainer.run.side_effect = lambda text, state: {"classification": "Other", "summary": text}
+    router = mock.MagicMock()
+    router.route.return_value = "GeneralAnalysis"
+    article_store = mock.MagicMock()
+    article_store.get.return_value = None
+    article_store.recent.return_value = []
+    evaluator = mock.MagicMock()
+    evaluator.run.return_value = "## Summary\nok"
+    grader = mock.MagicMock()
+    grader.llm_grade_structured.return_value = {"overall": 7}
+    return {"toolbox": toolbox, "memory": memory, "planner": planner, "prompt_chainer": prompt_chainer,
+            "router": router, "evaluator": evaluator, "article_store": article_store, "grader": grader}
+
+
+def test_plan_with_two_newsapi_steps_produces_a_thesis(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "load_env", lambda: None)
+    monkeypatch.setenv("BLOB_STORE_DIR", str(tmp_path))
+    shared = {"title": "Chip demand", "description": "Both names", "url": "https://example.com/shared"}
+    articles = {
+        "NVDA": [shared, {"title": "NVDA beats", "description": "", "url": "https://example.com/nvda"}],
+        "AMD": [shared, {"title": "AMD guides", "description": "", "url": "https://example.com/amd"}],
+    }
+    agents = fake_agents([news_step("1", "NVDA"), news_step("2", "AMD")], articles)
+
+    state = main.run_analysis("NVDA", agents=agents)
+
+    assert state["final_thesis"] == "## Summary\nok"
+    # Both news outputs feed one chain, and an article returned by both is processed once
+    assert agents["prompt_chainer"].run.call_count == 3
+    assert len(state["processed_news"]) == 3
+    agents["memory"].update.assert_called_once()
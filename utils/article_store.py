@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from utils.utils import atomic_write_json, file_lock
+
+
+def article_id(article: dict) -> str:
+    """Stable identity of a news article: its URL plus a hash of the text the chain reads."""
+    text = (article.get('title') or '') + "\n" + (article.get('description') or '')
+    url_hash = hashlib.sha256((article.get('url') or '').encode("utf-8")).hexdigest()[:16]
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return f"{url_hash}:{content_hash}"
+
+
+class ArticleStore:
+    """Processed news results (classification, extraction, summary, route) persisted by article identity.
+
+    An article is processed once, and kept with every symbol whose news returned it.
+    """
+
+    def __init__(self, db_path: str = None, retention_days: int = None):
+        self.db_path = db_path or os.environ.get('ARTICLE_DB_PATH', 'article_db.json')
+        self.retention = timedelta(days=int(retention_days or os.environ.get('ARTICLE_RETENTION_DAYS', 30)))
+        self.lock = threading.Lock()
+        self.articles = self._load()
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.db_path):
+                return {}
+            with open(self.db_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f" Failed to load article DB: {e}")
+            return {}
+
+    @staticmethod
+    def _symbols(entry: dict) -> list:
+        # Entries written before articles could belong to several symbols have a single 'symbol'
+        return entry.get("symbols") or ([entry["symbol"]] if entry.get("symbol") else [])
+
+    def _with_symbols(self, entry: dict, symbols) -> dict:
+        entry = {k: v for k, v in entry.items() if k != "symbol"}
+        entry["symbols"] = sorted(set(symbols))
+        return entry
+
+    def _save(self, key: str):
+        try:
+            # Merge into the on-disk DB under a file lock (other worker processes write to it too),
+            # then replace atomically so a crash never leaves a half-written file
+            with file_lock(self.db_path):
+                entry = self.articles[key]
+                on_disk = self._load()
+                if key in on_disk:
+                    # Another process may have attributed the same article to other symbols
+                    entry = self._with_symbols(entry, self._symbols(entry) + self._symbols(on_disk[key]))
+                self.articles = {**on_disk, key: entry}
+                self._prune()
+                atomic_write_json(self.db_path, self.articles)
+        except Exception as e:
+            print(f" Failed to save article DB: {e}")
+
+    def _prune(self):
+        cutoff = (datetime.now() - self.retention).isoformat()
+        self.articles = {k: v for k, v in self.articles.items() if v.get("processed_at", "") >= cutoff}
+
+    def get(self, key: str) -> dict:
+        with self.lock:
+            return self.articles.get(key)
+
+    def put(self, key: str, symbol: str, article: dict, result: dict):
+        """Stores a processed article and drops entries older than the retention window."""
+        with self.lock:
+            known = self.articles.get(key)
+            self.articles[key] = {
+                **{k: v for k, v in result.items() if k != "symbol"},
+                "symbols": sorted(set(self._symbols(known) if known else []) | {symbol}),
+                "title": article.get('title'),
+                "url": article.get('url'),
+                "publishedAt": article.get('publishedAt'),
+                "processed_at": datetime.now().isoformat(),
+            }
+            self._save(key)
+
+    def add_symbol(self, key: str, symbol: str):
+        """Attributes an already processed article to another symbol as well."""
+        with self.lock:
+            entry = self.articles.get(key)
+            if entry is None or symbol in self._symbols(entry):
+                return
+            self.articles[key] = self._with_symbols(entry, self._symbols(entry) + [symbol])
+            self._save(key)
+
+    def recent(self, symbol: str, limit: int = 10, exclude: set = ()) -> list:
+        """Most recently published processed articles for a symbol."""
+        with self.lock:
+            entries = [v for k, v in self.articles.items() if symbol in self._symbols(v) and k not in exclude]
+        entries.sort(key=lambda v: v.get("publishedAt") or "", reverse=True)
+        return entries[:limit]
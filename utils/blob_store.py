@@ -0,0 +1,83 @@
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+
+
+class BlobRef:
+    """Handle to a blob on disk; content is read lazily through a memory map."""
+
+    __slots__ = ("root", "digest", "size", "kind")
+
+    def __init__(self, root: str, digest: str, size: int, kind: str = "bytes"):
+        self.root = root
+        self.digest = digest
+        self.size = size
+        self.kind = kind
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.root, self.digest[:2], self.digest)
+
+    def read(self, offset: int = 0, length: int = None) -> bytes:
+        """Reads `length` bytes from `offset` without loading the rest of the blob."""
+        if self.size == 0:
+            return b""
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            end = self.size if length is None else min(self.size, offset + length)
+            return view[offset:end]
+
+    def text(self, length: int = None) -> str:
+        return self.read(0, length).decode("utf-8", errors="ignore")
+
+    def json(self):
+        return json.loads(self.read())
+
+    def load(self):
+        """Returns the blob in the form it was stored in (text, JSON value or bytes)."""
+        if self.kind == "text":
+            return self.text()
+        if self.kind == "json":
+            return self.json()
+        return self.read()
+
+    def __repr__(self):
+        return f"<blob {self.kind} {self.digest[:12]} {self.size}B>"
+
+
+class BlobStore:
+    """Content-addressed store: identical content is written once and shared by every run."""
+
+    def __init__(self, root: str = None):
+        self.root = root or os.environ.get('BLOB_STORE_DIR', os.path.join("utils", "blobStore"))
+        os.makedirs(self.root, exist_ok=True)
+
+    def put_bytes(self, data: bytes, kind: str = "bytes") -> BlobRef:
+        digest = hashlib.sha256(data).hexdigest()
+        ref = BlobRef(self.root, digest, len(data), kind)
+        if not os.path.exists(ref.path):
+            os.makedirs(os.path.dirname(ref.path), exist_ok=True)
+            # Write to a temp file and rename so concurrent writers never expose partial blobs
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(ref.path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, ref.path)
+        return ref
+
+    def put_text(self, text: str) -> BlobRef:
+        return self.put_bytes(text.encode("utf-8"), kind="text")
+
+    def put_json(self, value) -> BlobRef:
+        return self.put_bytes(json.dumps(value, default=str).encode("utf-8"), kind="json")
+
+
+def materialize(value):
+    """Recursively replaces blob handles with their content (e.g. right before building a prompt)."""
+    if isinstance(value, BlobRef):
+        return value.load()
+    if isinstance(value, dict):
+        return {k: materialize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [materialize(v) for v in value]
+    return value
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+class EmbeddingService:
+    """Shared in-process sentence embeddings for every embedding-based feature.
+
+    Concurrent `embed` calls are micro-batched: requests queue up for at most `max_wait` seconds
+    (or until `batch_size` texts are waiting) and are encoded in one model call. Embeddings are
+    L2-normalized and cached by text hash. The CPU backend is selected by EMBEDDING_BACKEND:
+    "torch" (full precision), "int8" (dynamically quantized Linear layers) or "onnx" (ONNX Runtime
+    through sentence-transformers); a backend that cannot be loaded falls back to "torch".
+    """
+
+    def __init__(self, model_name: str = None, backend: str = None, batch_size: int = None,
+                 max_wait: float = None, cache_size: int = None):
+        self.model_name = model_name or os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        self.backend = (backend or os.environ.get('EMBEDDING_BACKEND', 'torch')).lower()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{self.backend}', expected one of {BACKENDS}")
+        self.batch_size = int(batch_size or os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+        self.max_wait = float(max_wait if max_wait is not None else os.environ.get('EMBEDDING_BATCH_WAIT_MS', 5)) / 1000
+        self.cache_size = int(cache_size if cache_size is not None else os.environ.get('EMBEDDING_CACHE_SIZE', 20000))
+        self.model = None
+        self.failed = False
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.worker = None
+        self.stats = {"texts": 0, "cache_hits": 0, "batches": 0, "encoded": 0}
+
+    # ------------------------------------------------------------
+    # Model loading
+    # ------------------------------------------------------------
+    def _load_backend(self, backend: str):
+        from sentence_transformers import SentenceTransformer
+
+        if backend == "onnx":
+            onnx_file = os.environ.get('EMBEDDING_ONNX_FILE')
+            return SentenceTransformer(self.model_name, device="cpu", backend="onnx",
+                                       model_kwargs={"file_name": onnx_file} if onnx_file else None)
+        model = SentenceTransformer(self.model_name, device="cpu")
+        if backend == "int8":
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def available(self) -> bool:
+        """Loads the model on first use; False if no backend (not even torch) could be loaded."""
+        with self.lock:
+            if self.model is None and not self.failed:
+                try:
+                    self.model = self._load_backend(self.backend)
+                except Exception as e:
+                    if self.backend != "torch":
+                        print(f" Embedding backend '{self.backend}' unavailable ({e}); falling back to torch.")
+                        self.backend = "torch"
+                        try:
+                            self.model = self._load_backend("torch")
+                        except Exception as e2:
+                            e = e2
+                    if self.model is None:
+                        print(f" Embedding model unavailable: {e}")
+                        self.failed = True
+            return self.model is not None
+
+    # ------------------------------------------------------------
+    # Micro-batching
+    # ------------------------------------------------------------
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+                self.worker.start()
+
+    def _batch_loop(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                vectors = np.asarray(self.model.encode([text for text, _, _ in batch], batch_size=len(batch)),
+                                     dtype=np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["encoded"] += len(batch)
+                for (_, key, _), vector in zip(batch, vectors):
+                    self._remember(key, vector)
+            for (_, _, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.cache_size <= 0:
+            return
+        self.cache[key] = vector
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def embed(self, texts: list) -> np.ndarray:
+        """Normalized embeddings (n x d, float32) for texts, from the cache or a shared batch."""
+        texts = ["" if text is None else str(text) for text in texts]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if not self.available():
+            raise RuntimeError(f"Embedding model '{self.model_name}' is unavailable")
+
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors, pending = {}, {}
+        with self.lock:
+            self.stats["texts"] += len(texts)
+            for key, text in zip(keys, texts):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    vectors[key] = self.cache[key]
+                    self.stats["cache_hits"] += 1
+                elif key not in pending:
+                    pending[key] = (text, Future())
+        if pending:
+            self._ensure_worker()
+            for key, (text, future) in pending.items():
+                self.requests.put((text, key, future))
+            for key, (_, future) in pending.items():
+                vectors[key] = future.result()
+        return np.vstack([vectors[key] for key in keys])
+
+    def embed_one(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_embedder(model_name: str = None, backend: str = None) -> EmbeddingService:
+    """Process-wide embedding service per (model, backend), shared by all agents and the evaluator."""
+    model_name = model_name or os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    backend = (backend or os.environ.get('EMBEDDING_BACKEND', 'torch')).lower()
+    with _shared_lock:
+        if (model_name, backend) not in _shared:
+            _shared[(model_name, backend)] = EmbeddingService(model_name, backend)
+        return _shared[(model_name, backend)]
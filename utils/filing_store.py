@@ -0,0 +1,266 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from itertools import zip_longest
+from utils.blob_store import BlobRef, BlobStore
+from utils.utils import atomic_write_json, file_lock
+
+# Filings compared against the previous base filing (10-K or 10-Q) of their group; event filings
+# (8-K, 13D/G) stand alone. Amendments are diffed but never become the baseline, as they often
+# only restate part of the report.
+COMPARABLE_FORMS = {"10-K": "10-K", "10-K/A": "10-K", "10-Q": "10-Q", "10-Q/A": "10-Q"}
+
+PART_PATTERN = re.compile(r"^PART\s+(IV|I{1,3})\b", re.IGNORECASE)
+ITEM_PATTERN = re.compile(r"^ITEM\s+(\d{1,2}[A-C]?)\s*[.:\-—–]?", re.IGNORECASE)
+BLOCK_TAGS = {"p", "div", "br", "tr", "li", "table", "h1", "h2", "h3", "h4", "h5", "h6"}
+# Unchanged text of a changed section shorter than this is not worth a summary
+MIN_REMAINDER_CHARS = 200
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self.skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self.skip = max(0, self.skip - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+
+def html_to_text(content) -> str:
+    """Plain text of an HTML (or text) filing, one block element per line."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    extractor = _TextExtractor()
+    extractor.feed(content)
+    lines = (" ".join(line.split()) for line in "".join(extractor.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def split_sections(text: str) -> dict:
+    """Splits a 10-K/10-Q into {"Part I Item 2": text, ...}; text before the first item is the cover.
+
+    Table-of-contents entries share their item's key, so they are folded into the same section.
+    """
+    sections, titles = {}, {}
+    part, key = "", "Cover"
+    for line in text.splitlines():
+        part_match = PART_PATTERN.match(line)
+        if part_match:
+            part = f"Part {part_match.group(1).upper()} "
+            continue
+        item_match = ITEM_PATTERN.match(line)
+        if item_match:
+            key = f"{part}Item {item_match.group(1).upper()}"
+            titles.setdefault(key, line[:100])
+        sections.setdefault(key, []).append(line)
+    return {key: {"title": titles.get(key, key), "text": "\n".join(lines)} for key, lines in sections.items()}
+
+
+def diff_section(old: str, new: str) -> tuple:
+    """(passages, unchanged): lines added or rewritten in `new` ("+ ...") and removed from `old`
+    ("- ..."), and the text of the lines both versions share."""
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    passages, unchanged = [], []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            unchanged.extend(new_lines[j1:j2])
+            continue
+        # Rewritten lines alternate old/new, so a capped section still shows both versions
+        for old_line, new_line in zip_longest(old_lines[i1:i2], new_lines[j1:j2]):
+            if old_line is not None:
+                passages.append(f"- {old_line}")
+            if new_line is not None:
+                passages.append(f"+ {new_line}")
+    return passages, "\n".join(unchanged)
+
+
+def _text_digest(text: str) -> str:
+    # Same digest the blob store gives the text, so section and remainder summaries share one cache
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cap_lines(lines: list, max_chars: int) -> list:
+    kept, used = [], 0
+    for index, line in enumerate(lines):
+        if kept and used + len(line) > max_chars:
+            return kept + [f"...[{len(lines) - index} more lines]"]
+        kept.append(line[:max_chars])
+        used += len(line) + 1
+    return kept
+
+
+class FilingStore:
+    """Processed SEC filings by accession number, with section texts in the BlobStore.
+
+    A filing never changes once filed, so each accession is downloaded, split and diffed once.
+    Its rendered delta (changed passages vs the previous comparable filing, plus summaries of the
+    unchanged sections and of the unchanged text within changed ones) is stored with it. Summaries
+    are cached by content hash, so identical boilerplate is summarized once across filings and symbols.
+    """
+
+    def __init__(self, db_path: str = None, blobs: BlobStore = None, max_delta_chars: int = None,
+                 max_section_chars: int = None):
+        self.db_path = db_path or os.environ.get('FILING_DB_PATH', 'filing_db.json')
+        self.blobs = blobs or BlobStore()
+        self.max_delta_chars = int(max_delta_chars or os.environ.get('FILING_DELTA_MAX_CHARS', 20000))
+        self.max_section_chars = int(max_section_chars or os.environ.get('FILING_SECTION_MAX_CHARS', 4000))
+        self.lock = threading.Lock()
+        self.db = self._load()
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.db_path):
+                return {"filings": {}, "summaries": {}}
+            with open(self.db_path, 'r') as f:
+                db = json.load(f)
+            db.setdefault("filings", {})
+            db.setdefault("summaries", {})
+            return db
+        except Exception as e:
+            print(f" Failed to load filing DB: {e}")
+            return {"filings": {}, "summaries": {}}
+
+    def _save(self, accession: str = None, filing: dict = None, summaries: dict = None):
+        try:
+            # Merge into the on-disk DB under a file lock; worker processes share it. The in-memory
+            # lock keeps other threads from swapping self.db between the reload and the write.
+            with self.lock, file_lock(self.db_path):
+                self.db = self._load()
+                if filing is not None:
+                    self.db["filings"][accession] = filing
+                self.db["summaries"].update(summaries or {})
+                atomic_write_json(self.db_path, self.db)
+        except Exception as e:
+            print(f" Failed to save filing DB: {e}")
+
+    def _section_text(self, section: dict) -> str:
+        return BlobRef(self.blobs.root, section["digest"], section["size"], "text").text()
+
+    def get(self, accession: str) -> dict:
+        with self.lock:
+            return self.db["filings"].get(accession)
+
+    def delta_text(self, accession: str) -> str:
+        filing = self.get(accession)
+        return self._section_text(filing["delta"]) if filing and filing.get("delta") else None
+
+    def previous_comparable(self, symbol: str, form_type: str, filed_at: str) -> tuple:
+        """(accession, entry) of the latest stored base filing of the same group filed before `filed_at`."""
+        group = COMPARABLE_FORMS.get(form_type)
+        if group is None:
+            return None, None
+        with self.lock:
+            candidates = [(accession, entry) for accession, entry in self.db["filings"].items()
+                          if entry["symbol"] == symbol and entry["form_type"] == group
+                          and entry["filed_at"] < filed_at]
+        return max(candidates, key=lambda item: item[1]["filed_at"], default=(None, None))
+
+    # ------------------------------------------------------------
+    # Processing a new filing
+    # ------------------------------------------------------------
+    def process(self, accession: str, symbol: str, form_type: str, filed_at: str, description: str,
+                content, summarize=None) -> str:
+        """Stores a new filing and returns its delta digest for the thesis.
+
+        `summarize(sections)` maps {key: text} of unchanged sections without a cached summary to
+        {key: summary}; sections it returns no summary for are shown by their opening lines, which
+        are not cached, so a later filing with the same text asks for its summary again.
+        """
+        text = html_to_text(content)
+        sections = split_sections(text) if form_type in COMPARABLE_FORMS else {"Document": {"title": description, "text": text}}
+        stored = {}
+        for key, section in sections.items():
+            ref = self.blobs.put_text(section["text"])
+            stored[key] = {"title": section["title"], "digest": ref.digest, "size": ref.size}
+
+        header = f"{form_type} filed {filed_at[:10]} ({description}, accession {accession})"
+        previous_accession, previous = self.previous_comparable(symbol, form_type, filed_at)
+        new_summaries = {}
+        if previous is None:
+            # First filing of its kind: every section is new
+            intro, outro = [f"{header}: new filing, no earlier comparable filing processed."], []
+            blocks = [(f"[{key}] {section['title']}", [], section["text"].splitlines())
+                      for key, section in sections.items()]
+        else:
+            changed, unchanged, removed = [], [], [k for k in previous["sections"] if k not in stored]
+            remainders = {}
+            for key, section in stored.items():
+                old = previous["sections"].get(key)
+                if old and old["digest"] == section["digest"]:
+                    unchanged.append(key)
+                    continue
+                passages, remainder = diff_section(self._section_text(old) if old else "", sections[key]["text"])
+                changed.append((key, passages))
+                if len(remainder) >= MIN_REMAINDER_CHARS:
+                    remainders[key] = remainder
+
+            # Unchanged sections and the unchanged text of changed sections, by content digest
+            to_summarize = {key: (stored[key]["digest"], sections[key]["text"]) for key in unchanged}
+            to_summarize.update({f"{key} (unchanged text)": (_text_digest(text), text) for key, text in remainders.items()})
+            with self.lock:
+                missing = {label: text for label, (digest, text) in to_summarize.items()
+                           if digest not in self.db["summaries"]}
+            # Only summaries the LLM returned are cached; the extractive fallback serves this delta only
+            fallbacks = {}
+            if missing:
+                generated = (summarize(missing) if summarize else None) or {}
+                for label, section_text in missing.items():
+                    digest = to_summarize[label][0]
+                    if generated.get(label):
+                        new_summaries[digest] = generated[label]
+                    else:
+                        fallbacks[digest] = " ".join(section_text.splitlines()[1:4])[:300]
+
+            with self.lock:
+                summaries = {**self.db["summaries"], **fallbacks, **new_summaries}
+            intro = [f"{header}: compared with {previous['form_type']} filed {previous['filed_at'][:10]} "
+                     f"(accession {previous_accession}); {len(changed)} section(s) changed, {len(unchanged)} unchanged."]
+            blocks = [(f"[{key}] {sections[key]['title']} (changed)",
+                       [f"Unchanged text (summary): {summaries[_text_digest(remainders[key])]}"] if key in remainders else [],
+                       passages)
+                      for key, passages in changed]
+            outro = [""] if removed or unchanged else []
+            if removed:
+                outro.append(f"Removed sections: {', '.join(removed)}")
+            if unchanged:
+                outro.append("Unchanged sections (cached summaries):")
+                outro.extend(f"[{key}] {summaries.get(stored[key]['digest'], '')}" for key in unchanged)
+
+        # Every section gets an even share of the delta budget, so later items (MD&A, risk factors)
+        # are not crowded out by the first ones
+        share = min(self.max_section_chars, max(500, self.max_delta_chars // max(1, len(blocks))))
+        lines = intro
+        for title, summary, body in blocks:
+            lines.extend(["", title] + summary + _cap_lines(body, share))
+        delta = "\n".join(lines + outro)
+        delta_ref = self.blobs.put_text(delta)
+
+        self._save(accession, {
+            "symbol": symbol,
+            "form_type": form_type,
+            "filed_at": filed_at,
+            "description": description,
+            "sections": stored,
+            "delta": {"digest": delta_ref.digest, "size": delta_ref.size},
+        }, new_summaries)
+        return delta
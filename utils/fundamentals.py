@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from utils.utils import atomic_write_json, file_lock
+
+# The subset of yfinance `.info` the pipeline actually uses
+TEXT_FIELDS = ("shortName", "sector", "industry", "currency", "recommendationKey")
+NUMERIC_FIELDS = (
+    "currentPrice", "previousClose", "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "marketCap", "enterpriseValue",
+    "trailingPE", "forwardPE", "priceToBook", "trailingEps", "forwardEps", "totalRevenue", "revenueGrowth",
+    "earningsGrowth", "grossMargins", "operatingMargins", "profitMargins", "returnOnEquity", "debtToEquity",
+    "freeCashflow", "dividendYield", "beta", "targetMeanPrice", "numberOfAnalystOpinions",
+)
+
+
+class FundamentalsTable:
+    """Columnar table of normalized fundamentals: one array (or list) per field, one slot per symbol."""
+
+    def __init__(self, symbols: list, columns: dict):
+        self.symbols = list(symbols)
+        self.columns = columns
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_infos(cls, infos: dict) -> "FundamentalsTable":
+        symbols = [symbol for symbol, info in infos.items() if info]
+        columns = {field: [infos[s].get(field) for s in symbols] for field in TEXT_FIELDS}
+        for field in NUMERIC_FIELDS:
+            values = [infos[s].get(field) for s in symbols]
+            columns[field] = np.array([v if isinstance(v, (int, float)) else np.nan for v in values], dtype=np.float64)
+        return cls(symbols, columns)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._index
+
+    def row(self, symbol: str) -> dict:
+        """Returns one symbol's fields as a dict (missing values are dropped)."""
+        i = self._index.get(symbol)
+        if i is None:
+            return None
+        row = {"symbol": symbol}
+        for field, values in self.columns.items():
+            value = values[i]
+            if isinstance(value, float) and np.isnan(value):
+                continue
+            if value is not None:
+                row[field] = value.item() if isinstance(value, np.generic) else value
+        return row
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns, index=pd.Index(self.symbols, name="symbol"))
+
+
+def create_session():
+    """One HTTP session (connection pool, cookies and crumb) reused by every Ticker request.
+
+    Recent yfinance versions only accept curl_cffi sessions; older ones take a requests.Session.
+    """
+    try:
+        from curl_cffi import requests as curl_requests
+        return curl_requests.Session(impersonate="chrome")
+    except ImportError:
+        import requests
+        return requests.Session()
+
+
+class FundamentalsFetcher:
+    """Fetches yfinance fundamentals for many symbols with bounded concurrency over one shared session.
+
+    Concurrent requests for the same symbol share one in-flight fetch. Fetched rows (only the fields the
+    pipeline uses) are kept in an on-disk cache shared by worker processes for `cache_seconds`, so a
+    watchlist prefetched in bulk (worker.py enqueue/run) is not fetched again symbol by symbol.
+    """
+
+    def __init__(self, max_workers: int = None, batch_size: int = None, batch_pause: float = None, session=None,
+                 cache_path: str = None, cache_seconds: float = None):
+        self.max_workers = int(max_workers or os.environ.get('FUNDAMENTALS_MAX_WORKERS', 4))
+        self.batch_size = int(batch_size or os.environ.get('FUNDAMENTALS_BATCH_SIZE', 10))
+        self.batch_pause = float(batch_pause if batch_pause is not None else os.environ.get('FUNDAMENTALS_BATCH_PAUSE', 0))
+        self.cache_path = cache_path or os.environ.get('FUNDAMENTALS_CACHE_PATH', 'fundamentals_cache.json')
+        self.cache_seconds = float(cache_seconds if cache_seconds is not None else os.environ.get('FUNDAMENTALS_CACHE_SECONDS', 6 * 3600))
+        self.session = session or create_session()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fundamentals")
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.cache_lock = threading.Lock()
+
+    def _fetch_info(self, symbol: str) -> dict:
+        return yf.Ticker(symbol, session=self.session).info
+
+    # ------------------------------------------------------------
+    # On-disk cache shared by worker processes
+    # ------------------------------------------------------------
+    def _load_cache(self) -> dict:
+        try:
+            if not os.path.exists(self.cache_path):
+                return {}
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f" Failed to load fundamentals cache: {e}")
+            return {}
+
+    def _cached(self, symbols: list) -> dict:
+        if self.cache_seconds <= 0:
+            return {}
+        cache, now = self._load_cache(), time.time()
+        return {symbol: cache[symbol]["info"] for symbol in symbols
+                if symbol in cache and now - cache[symbol]["fetched_at"] < self.cache_seconds}
+
+    def _store(self, infos: dict):
+        if self.cache_seconds <= 0 or not infos:
+            return
+        now = time.time()
+        try:
+            with self.cache_lock, file_lock(self.cache_path):
+                cache = {symbol: entry for symbol, entry in self._load_cache().items()
+                         if now - entry["fetched_at"] < self.cache_seconds}
+                for symbol, info in infos.items():
+                    cache[symbol] = {"fetched_at": now,
+                                     "info": {field: info.get(field) for field in TEXT_FIELDS + NUMERIC_FIELDS}}
+                atomic_write_json(self.cache_path, cache)
+        except Exception as e:
+            print(f" Failed to save fundamentals cache: {e}")
+
+    def submit(self, symbol: str):
+        """Returns the in-flight future for a symbol, starting a fetch only if none is running."""
+        with self.lock:
+            future = self.inflight.get(symbol)
+            if future is None:
+                future = self.executor.submit(self._fetch_info, symbol)
+                self.inflight[symbol] = future
+                future.add_done_callback(lambda _, s=symbol: self._release(s))
+            return future
+
+    def _release(self, symbol: str):
+        with self.lock:
+            self.inflight.pop(symbol, None)
+
+    def fetch(self, symbols: list) -> FundamentalsTable:
+        """Fetches all symbols not in the cache batch by batch and returns them as one columnar table."""
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        infos = self._cached(symbols)
+        missing = [symbol for symbol in symbols if symbol not in infos]
+        fetched = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            futures = {symbol: self.submit(symbol) for symbol in batch}
+            wait(list(futures.values()))
+            for symbol, future in futures.items():
+                try:
+                    fetched[symbol] = future.result()
+                except Exception as e:
+                    print(f" YFinance Error for {symbol}: {e}")
+                    fetched[symbol] = None
+            if self.batch_pause and start + self.batch_size < len(missing):
+                time.sleep(self.batch_pause)
+        self._store({symbol: info for symbol, info in fetched.items() if info})
+        return FundamentalsTable.from_infos({symbol: infos.get(symbol) or fetched.get(symbol) for symbol in symbols})
+
+
+_shared_fetcher = None
+_shared_lock = threading.Lock()
+
+
+def shared_fetcher() -> FundamentalsFetcher:
+    """Process-wide fetcher so every agent instance coalesces onto the same in-flight requests."""
+    global _shared_fetcher
+    with _shared_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = FundamentalsFetcher()
+        return _shared_fetcher
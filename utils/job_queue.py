@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+JOB_STATES = ("queued", "leased", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+
+class JobQueue:
+    """Durable symbol job queue in SQLite with leases, heartbeats and retry on lease expiry.
+
+    Any number of worker processes (on one host, or on several hosts sharing the database file)
+    lease jobs one at a time. A lease must be renewed by heartbeats; if a worker dies, its lease
+    expires and the job is handed to another worker, up to max_attempts times.
+    """
+
+    def __init__(self, path: str = None, lease_seconds: float = None, max_attempts: int = None):
+        self.path = path or os.environ.get('JOB_QUEUE_PATH', 'job_queue.db')
+        self.lease_seconds = float(lease_seconds or os.environ.get('JOB_LEASE_SECONDS', 120))
+        self.max_attempts = int(max_attempts or os.environ.get('JOB_MAX_ATTEMPTS', 3))
+        # WAL needs shared memory on one host; use DELETE when workers on several hosts share the file
+        self.journal_mode = os.environ.get('JOB_QUEUE_JOURNAL_MODE', 'WAL')
+        with self._connect() as db:
+            db.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation, so heartbeat threads and workers never share one
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, symbols: list, max_attempts: int = None) -> list:
+        """Adds one job per symbol, skipping symbols that already have a queued or leased job."""
+        ids = []
+        with self._transaction() as db:
+            for symbol in symbols:
+                symbol = symbol.strip().upper()
+                active = db.execute("SELECT id FROM jobs WHERE symbol = ? AND status IN ('queued', 'leased')",
+                                    (symbol,)).fetchone()
+                if active:
+                    ids.append(active["id"])
+                    continue
+                cursor = db.execute("INSERT INTO jobs (symbol, max_attempts, enqueued_at) VALUES (?, ?, ?)",
+                                    (symbol, max_attempts or self.max_attempts, time.time()))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def lease(self, worker_id: str) -> dict:
+        """Atomically leases the oldest runnable job (queued, or leased with an expired lease)."""
+        now = time.time()
+        with self._transaction() as db:
+            # Expired leases that used up their attempts are failed rather than retried
+            db.execute("UPDATE jobs SET status = 'failed', error = 'lease expired after max attempts', finished_at = ? "
+                       "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+            job = db.execute("SELECT * FROM jobs WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?) "
+                             "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if job is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                       "started_at = ? WHERE id = ?", (worker_id, now + self.lease_seconds, now, job["id"]))
+            return {**dict(job), "status": "leased", "lease_owner": worker_id, "attempts": job["attempts"] + 1}
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Extends the lease; False means the lease was lost (expired and taken by another worker)."""
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                (time.time() + self.lease_seconds, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: dict = None) -> bool:
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET status = 'done', finished_at = ?, result = ?, error = NULL "
+                                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                (time.time(), json.dumps(result, default=str), job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Requeues the job if it has attempts left, otherwise marks it failed."""
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                                "lease_owner = NULL, lease_expires = NULL, error = ?, finished_at = ? "
+                                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                (error, time.time(), job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def counts(self) -> dict:
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def jobs(self, status: str = None, limit: int = 50) -> list:
+        with self._connect() as db:
+            query = "SELECT * FROM jobs" + (" WHERE status = ?" if status else "") + " ORDER BY id DESC LIMIT ?"
+            rows = db.execute(query, ((status, limit) if status else (limit,))).fetchall()
+        return [dict(row) for row in rows]
@@ -1,8 +1,11 @@
 import os
 import json
+import time
 import google.generativeai as genai
+from utils.token_accounting import estimate_tokens, note_degradation, record_usage
 
-def call_gemini(system_instruction: str, user_prompt: str, json_output: bool = True) -> dict | str:
+def call_gemini(system_instruction: str, user_prompt: str, json_output: bool = True,
+                agent: str = None, stage: str = None) -> dict | str:
     """
     Calls the Gemini API with a system instruction and user prompt.
 
@@ -10,6 +13,8 @@ def call_gemini(system_instruction: str, user_prompt: str, json_output: bool = T
         system_instruction: The system instruction for the model.
         user_prompt: The user's prompt.
         json_output: Whether to expect a JSON output from the model.
+        agent: Calling agent, for token accounting.
+        stage: Pipeline stage, for token accounting and budgets.
 
     Returns:
         A dictionary if json_output is True, otherwise a string.
@@ -20,16 +25,30 @@ def call_gemini(system_instruction: str, user_prompt: str, json_output: bool = T
     genai.configure(
         api_key=os.environ.get('GOOGLE_API_KEY'),
     )
-    
+
+    model_name = os.environ.get('GEMINI_MODEL_NAME')
     model = genai.GenerativeModel(
-        model_name=os.environ.get('GEMINI_MODEL_NAME'),
+        model_name=model_name,
         generation_config={"response_mime_type": "application/json"} if json_output else None
     )
-    
+
+    # Last-resort guard against pathological prompts (e.g. a huge filing)
+    max_prompt_tokens = int(os.environ.get('LLM_MAX_PROMPT_TOKENS', 200000))
+    if estimate_tokens(user_prompt) > max_prompt_tokens:
+        note_degradation(stage or "unknown", "truncated prompt",
+                         f"~{estimate_tokens(user_prompt)} tokens > LLM_MAX_PROMPT_TOKENS={max_prompt_tokens}")
+        user_prompt = user_prompt[:max_prompt_tokens * 4]
+
     prompt = f"{system_instruction}\n\n{user_prompt}"
 
     try:
+        started = time.perf_counter()
         response = model.generate_content(prompt)
+        usage = getattr(response, "usage_metadata", None)
+        record_usage(agent, stage, model_name, prompt, response.text,
+                     input_tokens=getattr(usage, "prompt_token_count", None),
+                     output_tokens=getattr(usage, "candidates_token_count", None),
+                     latency=time.perf_counter() - started)
         if json_output:
             return json.loads(response.text)
         return response.text
@@ -0,0 +1,269 @@
+import os
+import threading
+import warnings
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay, USMartinLutherKingJr,
+                                    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday,
+                                    sunday_to_monday)
+from utils.utils import file_lock
+
+# Column layout of every on-disk record: day number since epoch, then OHLCV
+COLUMNS = ("day", "open", "high", "low", "close", "volume")
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+TRADING_DAYS = 252
+EPOCH = date(1970, 1, 1)
+MARKET_TZ = ZoneInfo("America/New_York")
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """Regular NYSE full-day closures (one-off closures, e.g. days of mourning, are not listed)."""
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+def last_session(now: datetime = None) -> int:
+    """Day number of the latest NYSE session whose daily bar is final (after 17:00 New York time)."""
+    now = now.astimezone(MARKET_TZ) if now else datetime.now(MARKET_TZ)
+    day = now.date() if now.hour >= 17 else now.date() - timedelta(days=1)
+    holidays = set(NYSEHolidayCalendar().holidays(day - timedelta(days=10), day).date)
+    while day.weekday() >= 5 or day in holidays:
+        day -= timedelta(days=1)
+    return (day - EPOCH).days
+
+
+def _ffill(matrix: np.ndarray) -> np.ndarray:
+    """Forward-fills NaNs down each column (leading NaNs stay NaN)."""
+    rows = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+def _trailing_return(close: np.ndarray, days: int) -> np.ndarray:
+    if close.shape[0] <= days:
+        return np.full(close.shape[1], np.nan)
+    return close[-1] / close[-1 - days] - 1
+
+
+def _rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Wilder's RSI for every column; loops over time, vectorized across symbols."""
+    delta = np.diff(close[-(TRADING_DAYS + 1):], axis=0)
+    if delta.shape[0] < period:
+        return np.full(close.shape[1], np.nan)
+    gains, losses = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+    avg_gain = np.nanmean(gains[:period], axis=0)
+    avg_loss = np.nanmean(losses[:period], axis=0)
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = np.where(np.isnan(gain), avg_gain, (avg_gain * (period - 1) + gain) / period)
+        avg_loss = np.where(np.isnan(loss), avg_loss, (avg_loss * (period - 1) + loss) / period)
+    return 100 - 100 / (1 + avg_gain / np.where(avg_loss == 0, np.nan, avg_loss))
+
+
+def _beta(returns: np.ndarray, index_returns: np.ndarray) -> np.ndarray:
+    """Beta of every column against the index over the rows where both are observed."""
+    valid = ~np.isnan(returns) & ~np.isnan(index_returns)[:, None]
+    r = np.where(valid, returns, 0.0)
+    m = np.where(valid, index_returns[:, None], 0.0)
+    n = valid.sum(axis=0).astype(float)
+    n[n < 2] = np.nan
+    mean_r, mean_m = r.sum(axis=0) / n, m.sum(axis=0) / n
+    cov = ((r - mean_r) * (m - mean_m) * valid).sum(axis=0) / (n - 1)
+    var = (((m - mean_m) ** 2) * valid).sum(axis=0) / (n - 1)
+    return cov / np.where(var == 0, np.nan, var)
+
+
+def compute_features(close: np.ndarray, index_close: np.ndarray = None) -> dict:
+    """Computes technical features for every column of a (days x symbols) close matrix at once."""
+    close = _ffill(close)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        returns = close[1:] / close[:-1] - 1
+        year = close[-TRADING_DAYS:]
+        drawdown = year / np.fmax.accumulate(year, axis=0) - 1
+
+        features = {
+            "last_close": close[-1],
+            "return_1m": _trailing_return(close, 21),
+            "return_3m": _trailing_return(close, 63),
+            "return_1y": _trailing_return(close, TRADING_DAYS),
+            "volatility_3m": np.nanstd(returns[-63:], axis=0, ddof=1) * np.sqrt(TRADING_DAYS),
+            "max_drawdown_1y": np.nanmin(drawdown, axis=0),
+            "drawdown": drawdown[-1],
+            "sma_50": np.nanmean(close[-50:], axis=0),
+            "sma_200": np.nanmean(close[-200:], axis=0),
+            "rsi_14": _rsi(close),
+        }
+        if index_close is not None:
+            index_close = _ffill(index_close.reshape(-1, 1))[:, 0]
+            index_returns = index_close[1:] / index_close[:-1] - 1
+            features["beta_1y"] = _beta(returns[-TRADING_DAYS:], index_returns[-TRADING_DAYS:])
+    return features
+
+
+class MarketDataStore:
+    """Split- and dividend-adjusted OHLCV history kept on disk as float64 arrays, one file per symbol.
+
+    New sessions are appended. Adjusted prices of past days change after every split or dividend, so each
+    update re-downloads the last stored day too; if its close no longer matches, the symbol's whole history
+    is downloaded again and rewritten, keeping one price scale per file.
+    """
+
+    def __init__(self, data_dir: str = None, index_symbol: str = None, history_years: float = None):
+        self.data_dir = data_dir or os.environ.get('MARKET_DATA_DIR', os.path.join("utils", "marketData"))
+        self.index_symbol = index_symbol or os.environ.get('MARKET_INDEX', '^GSPC')
+        self.history_years = float(history_years or os.environ.get('MARKET_HISTORY_YEARS', 2))
+        self.lock = threading.Lock()
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.data_dir, f"{symbol.replace('^', '_')}.f64")
+
+    def load(self, symbol: str) -> np.ndarray:
+        """Memory-maps a symbol's history as an (n x 6) array with COLUMNS layout."""
+        path = self._path(symbol)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty((0, len(COLUMNS)))
+        return np.memmap(path, dtype=np.float64, mode='r').reshape(-1, len(COLUMNS))
+
+    def _last_row(self, symbol: str):
+        history = self.load(symbol)
+        return np.array(history[-1]) if len(history) else None
+
+    def append(self, symbol: str, rows: np.ndarray) -> int:
+        """Appends rows newer than the stored history; returns how many were written."""
+        # Locked across processes: two workers appending the same days would duplicate rows
+        with file_lock(self._path(symbol)):
+            last = self._last_row(symbol)
+            if last is not None:
+                rows = rows[rows[:, 0] > last[0]]
+            if len(rows):
+                with open(self._path(symbol), 'ab') as f:
+                    np.ascontiguousarray(rows, dtype=np.float64).tofile(f)
+        return len(rows)
+
+    def replace(self, symbol: str, rows: np.ndarray) -> int:
+        """Rewrites a symbol's whole history (after a split or dividend changed the adjusted prices)."""
+        path = self._path(symbol)
+        with file_lock(path):
+            # Readers that still map the old file keep a consistent view; new loads see the new one
+            np.ascontiguousarray(rows, dtype=np.float64).tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+        return len(rows)
+
+    # ------------------------------------------------------------
+    # Bulk download of every stale symbol in one request
+    # ------------------------------------------------------------
+    def _download(self, starts: dict, session: int) -> dict:
+        """{symbol: (n x 6) rows} of completed sessions from each symbol's start day, in one yf.download call."""
+        start = EPOCH + timedelta(days=min(starts.values()))
+        print(f"Downloading price history for {len(starts)} symbols from {start}")
+        data = yf.download(tickers=list(starts), start=start.isoformat(), auto_adjust=True,
+                           group_by="column", progress=False, threads=True)
+        if data is None or data.empty:
+            return {}
+        if not isinstance(data.columns, pd.MultiIndex):
+            data.columns = pd.MultiIndex.from_product([data.columns, list(starts)])
+
+        index = data.index.tz_localize(None) if data.index.tz is not None else data.index
+        days = index.values.astype("datetime64[D]").astype(np.int64).astype(np.float64)
+        blocks = {}
+        for symbol, first_day in starts.items():
+            if ("Close", symbol) not in data.columns:
+                continue
+            block = np.column_stack([days] + [
+                data[(field, symbol)].to_numpy(dtype=np.float64) if (field, symbol) in data.columns
+                else np.full(len(days), np.nan)
+                for field in PRICE_FIELDS])
+            # The current session's bar is still moving until the close, so it is not stored yet
+            keep = ~np.isnan(block[:, 4]) & (block[:, 0] >= first_day) & (block[:, 0] <= session)
+            blocks[symbol] = block[keep]
+        return blocks
+
+    def stale(self, symbols: list) -> list:
+        """Symbols whose stored history ends before the last completed session."""
+        session = last_session()
+        stale = []
+        for symbol in symbols:
+            last = self._last_row(symbol)
+            if last is None or last[0] < session:
+                stale.append(symbol)
+        return stale
+
+    def update(self, symbols: list) -> dict:
+        """Downloads missing history for all symbols with a single yf.download call."""
+        with self.lock:
+            session = last_session()
+            default_start = session - int(self.history_years * 365)
+            starts, stored = {}, {}
+            for symbol in symbols:
+                last = self._last_row(symbol)
+                if last is None:
+                    starts[symbol] = default_start
+                elif last[0] < session:
+                    # Overlap by one day to detect a change of the adjusted price scale
+                    starts[symbol], stored[symbol] = int(last[0]), last
+            if not starts:
+                return {}
+
+            written, rebuild = {}, []
+            for symbol, rows in self._download(starts, session).items():
+                last = stored.get(symbol)
+                if last is None:
+                    written[symbol] = self.append(symbol, rows)
+                    continue
+                overlap = rows[rows[:, 0] == last[0]]
+                if len(overlap) and np.isclose(overlap[0, 4], last[4], rtol=1e-6):
+                    written[symbol] = self.append(symbol, rows)
+                else:
+                    rebuild.append(symbol)
+
+            if rebuild:
+                print(f"Adjusted prices changed (split or dividend) for {', '.join(rebuild)}; reloading their history")
+                for symbol, rows in self._download({symbol: default_start for symbol in rebuild}, session).items():
+                    written[symbol] = self.replace(symbol, rows)
+            return written
+
+    def close_matrix(self, symbols: list) -> tuple:
+        """Aligns the stored closes of all symbols on the union of their trading days."""
+        histories = [self.load(symbol) for symbol in symbols]
+        days = np.unique(np.concatenate([h[:, 0] for h in histories])) if histories else np.empty(0)
+        matrix = np.full((len(days), len(symbols)), np.nan)
+        for column, history in enumerate(histories):
+            if len(history):
+                matrix[np.searchsorted(days, history[:, 0]), column] = history[:, 4]
+        return days, matrix
+
+    def features(self, symbols: list, refresh: bool = True) -> dict:
+        """Returns a compact technical feature row per symbol, computed for all symbols at once."""
+        symbols = [s.upper() for s in symbols]
+        if refresh:
+            self.update(symbols + [self.index_symbol])
+
+        days, matrix = self.close_matrix(symbols + [self.index_symbol])
+        if not len(days):
+            return {}
+        features = compute_features(matrix[:, :-1], matrix[:, -1])
+
+        as_of = (EPOCH + timedelta(days=int(days[-1]))).isoformat()
+        rows = {}
+        for column, symbol in enumerate(symbols):
+            if np.isnan(features["last_close"][column]):
+                continue
+            row = {name: (None if np.isnan(values[column]) else round(float(values[column]), 4))
+                   for name, values in features.items()}
+            row["as_of"] = as_of
+            rows[symbol] = row
+        return rows
@@ -0,0 +1,219 @@
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+# (profiler, stage) of the stage the current code runs in; None when profiling is off
+_current_stage = contextvars.ContextVar("profile_stage", default=None)
+CPU_METHOD = ("CPU: per-thread stack sampling. cProfile is process-wide on Python 3.12+, so it cannot "
+              "tell overlapping stages apart; each sample is attributed to the stage of its thread.")
+
+
+def _file_name(stage: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", stage)
+
+
+def profiled(fn):
+    """Attributes fn's work on pool threads to the enclosing stage (no-op when profiling is off)."""
+    active = _current_stage.get()
+    if active is None:
+        return fn
+    profiler, stage = active
+
+    def wrapper(*args, **kwargs):
+        with profiler.thread_scope(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class StageProfiler:
+    """Stack sampling and tracemalloc scoped to each pipeline stage, with a per-stage report directory.
+
+    A sampler thread records the stack of every thread running a stage (stage threads and pool threads
+    wrapped with `profiled`) every `sample_interval` seconds and attributes it to that thread's stage,
+    so stages that overlap in time get separate hot functions. tracemalloc is process-wide, so allocation
+    diffs and peaks of overlapping stages include each other's allocations. With `collapsed=True` the
+    samples are also written in the collapsed format used by flamegraph tools.
+    """
+
+    def __init__(self, out_dir: str, top_n: int = None, collapsed: bool = False, frames: int = None,
+                 sample_interval: float = None):
+        self.out_dir = out_dir
+        self.top_n = int(top_n or os.environ.get('PROFILE_TOP_N', 25))
+        self.collapsed = collapsed
+        self.frames = int(frames or os.environ.get('PROFILE_TRACEMALLOC_FRAMES', 10))
+        self.sample_interval = float(sample_interval or os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.labels = {}
+        self.threads = {}
+        self.samples = defaultdict(Counter)
+        self.active = 0
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started_tracing = False
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._sampler = threading.Thread(target=self._sample, name="stage-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        self.write_report()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def describe(self, stage: str, label: str):
+        self.labels[stage] = label
+
+    def wrap(self, stage: str, fn):
+        """Wraps a scheduler node so its call is profiled as `stage`."""
+        def wrapper(*args, **kwargs):
+            with self.stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    # ------------------------------------------------------------
+    # Stage and thread scopes
+    # ------------------------------------------------------------
+    @contextmanager
+    def thread_scope(self, stage: str):
+        """Samples the current thread as part of `stage`."""
+        thread_id = threading.get_ident()
+        token = _current_stage.set((self, stage))
+        with self.lock:
+            outer = self.threads.get(thread_id)
+            self.threads[thread_id] = stage
+        try:
+            yield
+        finally:
+            with self.lock:
+                if outer is None:
+                    self.threads.pop(thread_id, None)
+                else:
+                    self.threads[thread_id] = outer
+            _current_stage.reset(token)
+
+    @staticmethod
+    def _snapshot():
+        # The profiler's own bookkeeping is not part of any stage
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)))
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Profiles one stage: stack samples of its thread, allocation diff, and traced memory peak."""
+        with self.lock:
+            # The peak counter is process-wide; it is only reset when no other stage is running
+            if self.active == 0:
+                tracemalloc.reset_peak()
+            self.active += 1
+        before = self._snapshot()
+        current_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            with self.thread_scope(stage):
+                yield
+        finally:
+            elapsed = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            after = self._snapshot()
+            with self.lock:
+                self.active -= 1
+                self.stages[stage] = {
+                    "seconds": round(elapsed, 3),
+                    "traced_start_bytes": current_before,
+                    "traced_end_bytes": current,
+                    "peak_traced_bytes": peak,
+                    "allocations": after.compare_to(before, "lineno")[:self.top_n],
+                }
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            with self.lock:
+                threads = dict(self.threads)
+            frames = sys._current_frames()
+            for thread_id, stage in threads.items():
+                frame = frames.get(thread_id)
+                # Frames from the leaf up to the profiler's wrapper, i.e. only the stage's own code
+                stack = []
+                while frame is not None and frame.f_code.co_filename != __file__:
+                    code = frame.f_code
+                    function = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    stack.append((function, f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"))
+                    frame = frame.f_back
+                if stack:
+                    self.samples[stage][tuple(reversed(stack))] += 1
+
+    # ------------------------------------------------------------
+    # Report
+    # ------------------------------------------------------------
+    def _hot_functions(self, stage: str) -> tuple:
+        """(own, cumulative) sample counts per function of a stage."""
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.samples.get(stage, {}).items():
+            own[stack[-1][0]] += count
+            for function in {function for function, _ in stack}:
+                cumulative[function] += count
+        return own, cumulative
+
+    def _cpu_report(self, stage: str) -> str:
+        own, cumulative = self._hot_functions(stage)
+        if not own:
+            return "No stack samples recorded.\n"
+        total = sum(own.values())
+        lines = [f"{total} samples of the stage's threads, taken every {self.sample_interval * 1000:g} ms (waits included)"]
+        for title, counter in (("cumulative", cumulative), ("own", own)):
+            lines.append(f"\nHot functions by {title} samples (top {self.top_n}):")
+            lines.extend(f"  {count:>7} {count / total:>7.1%}  {function}" for function, count in counter.most_common(self.top_n))
+        return "\n".join(lines) + "\n"
+
+    def write_report(self) -> str:
+        """Writes <stage>.txt (hot functions, allocation sites, memory), <stage>.collapsed, and summary.json."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary = {}
+        for stage in sorted(set(self.stages) | set(self.samples)):
+            info = self.stages.get(stage, {})
+            allocations = info.get("allocations", [])
+            with open(os.path.join(self.out_dir, f"{_file_name(stage)}.txt"), 'w') as f:
+                f.write(f"Stage: {stage}" + (f" ({self.labels[stage]})" if stage in self.labels else "") + "\n")
+                f.write(CPU_METHOD + "\n")
+                if info:
+                    f.write(f"Wall time: {info['seconds']:.3f}s | traced memory {info['traced_start_bytes'] / 1e6:.1f} MB"
+                            f" -> {info['traced_end_bytes'] / 1e6:.1f} MB | peak {info['peak_traced_bytes'] / 1e6:.1f} MB"
+                            " (process-wide while the stage ran)\n\n")
+                f.write(self._cpu_report(stage))
+                f.write(f"\nAllocation sites by growth during the stage (top {self.top_n}):\n")
+                for diff in allocations:
+                    f.write(f"  {diff}\n")
+            if self.collapsed and self.samples.get(stage):
+                with open(os.path.join(self.out_dir, f"{_file_name(stage)}.collapsed"), 'w') as f:
+                    for stack, count in self.samples[stage].most_common():
+                        f.write(f"{';'.join(line for _, line in stack)} {count}\n")
+            summary[stage] = {
+                "label": self.labels.get(stage),
+                "seconds": info.get("seconds"),
+                "peak_traced_mb": round(info["peak_traced_bytes"] / 1e6, 2) if info else None,
+                "net_traced_mb": round((info["traced_end_bytes"] - info["traced_start_bytes"]) / 1e6, 2) if info else None,
+                "top_allocation": str(allocations[0]) if allocations else None,
+                "top_function": next(iter(self._hot_functions(stage)[0].most_common(1)), (None,))[0],
+            }
+        with open(os.path.join(self.out_dir, "summary.json"), 'w') as f:
+            json.dump(summary, f, indent=4)
+        print(f"\nProfile report written to {self.out_dir}")
+        return self.out_dir
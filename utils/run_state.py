@@ -0,0 +1,83 @@
+import os
+from collections import deque
+from utils.blob_store import BlobRef, BlobStore
+
+FIELDS = ("symbol", "last_run", "plan", "raw_data", "processed_news", "conversation_logs",
+          "final_thesis", "thesis_sources", "evaluation", "classification", "timings", "usage", "freshness")
+
+
+class RunState:
+    """Typed per-run state with explicit fields.
+
+    Supports the dict-style access the agents already use (state["x"], state.get, setdefault, "x" in state)
+    but only for the fields above. Large raw text is spilled to the content-addressed BlobStore and kept
+    as BlobRef handles, and the conversation log is bounded, so memory per in-flight symbol stays small.
+    """
+
+    __slots__ = FIELDS + ("blobs", "spill_threshold")
+
+    def __init__(self, symbol: str, blobs: BlobStore = None, spill_threshold: int = None, max_logs: int = None):
+        self.symbol = symbol
+        self.last_run = None
+        self.plan = []
+        self.raw_data = {}
+        self.processed_news = []
+        self.conversation_logs = deque(maxlen=int(max_logs or os.environ.get('RUN_STATE_MAX_LOGS', 500)))
+        self.final_thesis = None
+        self.thesis_sources = {}
+        self.evaluation = None
+        self.classification = None
+        self.timings = None
+        self.usage = None
+        self.freshness = None
+        self.blobs = blobs or BlobStore()
+        self.spill_threshold = int(spill_threshold or os.environ.get('RUN_STATE_SPILL_BYTES', 64 * 1024))
+
+    # ------------------------------------------------------------
+    # Dict-style access used by the agents
+    # ------------------------------------------------------------
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(f"RunState has no field '{key}'")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in FIELDS else None
+        return default if value is None else value
+
+    def setdefault(self, key, default=None):
+        if self.get(key) is None:
+            self[key] = default
+        return self[key]
+
+    def keys(self):
+        return FIELDS
+
+    # ------------------------------------------------------------
+    # Raw data spilling
+    # ------------------------------------------------------------
+    def spill(self, value):
+        """Moves large strings, or dicts of them, to the blob store and returns handles in their place.
+
+        Only text read back when the thesis prompt is built (filings) is spilled. Structured values
+        (news articles, fundamentals, technicals) stay in memory because stages read their fields directly.
+        """
+        if isinstance(value, BlobRef) or value is None:
+            return value
+        if isinstance(value, str):
+            return self.blobs.put_text(value) if len(value) >= self.spill_threshold else value
+        if isinstance(value, dict) and value and all(isinstance(v, (str, BlobRef)) for v in value.values()):
+            return {k: self.spill(v) for k, v in value.items()}
+        return value
+
+    def set_raw(self, key: str, value):
+        self.raw_data[key] = self.spill(value)
+        return self.raw_data[key]
@@ -0,0 +1,181 @@
+import contextvars
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+TERMINAL_STATES = ("completed", "failed", "timeout", "cancelled", "skipped")
+
+
+class DataflowScheduler:
+    """Runs a dependency graph of stages, starting each node as soon as its inputs are ready.
+
+    Each node is a callable taking a dict {dependency name: result} and returning its result.
+    Nodes may add further nodes while the graph is running (e.g. one node per planned tool call).
+    A node whose dependency failed or timed out still runs and receives None for that input,
+    mirroring how the agents already tolerate missing tool data.
+
+    With a StageProfiler (utils/profiler.py) every node is CPU- and memory-profiled as its own stage.
+
+    Timeouts and cancellation are cooperative: Python threads cannot be killed, so a node that
+    times out is abandoned (its late result is discarded) and nodes not yet started are cancelled.
+    """
+
+    def __init__(self, max_workers: int = 8, name: str = "pipeline", poll_interval: float = 0.5, profiler=None):
+        self.max_workers = max_workers
+        self.profiler = profiler
+        self.poll_interval = poll_interval
+        self.name = name
+        self.nodes = {}
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.started_at = None
+        self.finished_at = None
+
+    def add_node(self, name: str, fn, deps: list = (), timeout: float = None):
+        """Registers a node; safe to call from inside a running node."""
+        with self.lock:
+            if name in self.nodes:
+                raise ValueError(f"Duplicate node name: {name}")
+            self.nodes[name] = {
+                "name": name,
+                "fn": fn,
+                "deps": list(deps),
+                "timeout": timeout,
+                "status": "pending",
+                "result": None,
+                "error": None,
+                "start": None,
+                "end": None,
+            }
+
+    def cancel(self):
+        """Cancels every node that has not started yet and stops scheduling."""
+        self.cancel_event.set()
+
+    def _now(self):
+        return time.perf_counter() - self.started_at
+
+    def _ready_nodes(self):
+        with self.lock:
+            return [node for node in self.nodes.values()
+                    if node["status"] == "pending"
+                    and all(dep in self.nodes and self.nodes[dep]["status"] in TERMINAL_STATES
+                            for dep in node["deps"])]
+
+    def _finish(self, node, status, result=None, error=None):
+        node["status"] = status
+        node["result"] = result
+        node["error"] = error
+        node["end"] = self._now()
+
+    def _skip_pending(self, status, reason):
+        with self.lock:
+            for node in self.nodes.values():
+                if node["status"] == "pending":
+                    node["status"] = status
+                    node["error"] = reason
+
+    def run(self) -> dict:
+        """Executes the graph and returns {node name: result}."""
+        self.started_at = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        running = {}
+        try:
+            while True:
+                if self.cancel_event.is_set():
+                    for future, node in running.items():
+                        future.cancel()
+                        self._finish(node, "cancelled", error="Cancelled while running")
+                    self._skip_pending("cancelled", "Cancelled before start")
+                    break
+
+                for node in self._ready_nodes():
+                    inputs = {dep: self.nodes[dep]["result"] for dep in node["deps"]}
+                    node["status"] = "running"
+                    node["start"] = self._now()
+                    # Each node runs in a copy of the caller's context (e.g. the run's token ledger)
+                    fn = node["fn"] if self.profiler is None else self.profiler.wrap(node["name"], node["fn"])
+                    running[executor.submit(contextvars.copy_context().run, fn, inputs)] = node
+
+                if not running:
+                    # Nothing running and nothing ready: remaining nodes wait on missing dependencies
+                    self._skip_pending("skipped", "Unsatisfied dependencies")
+                    break
+
+                # Wake up for the nearest deadline, and periodically so cancel() is noticed
+                deadlines = [node["start"] + node["timeout"] for node in running.values() if node["timeout"]]
+                wait_for = min([self.poll_interval] + [max(0.0, d - self._now()) for d in deadlines])
+                done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    node = running.pop(future)
+                    try:
+                        self._finish(node, "completed", result=future.result())
+                    except Exception as e:
+                        self._finish(node, "failed", error=f"{e}\n{traceback.format_exc()}")
+
+                for future, node in list(running.items()):
+                    if node["timeout"] and self._now() - node["start"] >= node["timeout"]:
+                        future.cancel()
+                        running.pop(future)
+                        self._finish(node, "timeout", error=f"Timed out after {node['timeout']}s")
+                        print(f" Stage '{node['name']}' timed out after {node['timeout']}s")
+        except KeyboardInterrupt:
+            self.cancel()
+            self._skip_pending("cancelled", "Interrupted")
+            raise
+        finally:
+            self.finished_at = self._now()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return {name: node["result"] for name, node in self.nodes.items()}
+
+    # ------------------------------------------------------------
+    # Timing report
+    # ------------------------------------------------------------
+    def critical_path(self) -> list:
+        """Walks back from the last node to finish through the dependency that finished last."""
+        finished = [node for node in self.nodes.values() if node["end"] is not None and node["start"] is not None]
+        if not finished:
+            return []
+        node = max(finished, key=lambda n: n["end"])
+        path = [node]
+        while True:
+            preds = [self.nodes[dep] for dep in node["deps"]
+                     if dep in self.nodes and self.nodes[dep]["end"] is not None and self.nodes[dep]["start"] is not None]
+            if not preds:
+                break
+            node = max(preds, key=lambda n: n["end"])
+            path.append(node)
+        return [n["name"] for n in reversed(path)]
+
+    def timing_report(self) -> dict:
+        nodes = {}
+        for name, node in self.nodes.items():
+            duration = node["end"] - node["start"] if node["start"] is not None and node["end"] is not None else None
+            nodes[name] = {
+                "status": node["status"],
+                "start": round(node["start"], 3) if node["start"] is not None else None,
+                "duration": round(duration, 3) if duration is not None else None,
+            }
+        path = self.critical_path()
+        return {
+            "wall_time": round(self.finished_at or 0.0, 3),
+            "sum_of_stages": round(sum(n["duration"] or 0.0 for n in nodes.values()), 3),
+            "critical_path": path,
+            "critical_path_time": round(sum(nodes[name]["duration"] or 0.0 for name in path), 3),
+            "nodes": nodes,
+        }
+
+    def print_timing_report(self):
+        report = self.timing_report()
+        print(f"\n--- Stage Timings ({self.name}) ---")
+        for name, node in sorted(report["nodes"].items(), key=lambda kv: (kv[1]["start"] is None, kv[1]["start"] or 0)):
+            marker = "*" if name in report["critical_path"] else " "
+            start = f"{node['start']:8.2f}s" if node["start"] is not None else "        -"
+            duration = f"{node['duration']:8.2f}s" if node["duration"] is not None else "        -"
+            print(f" {marker} {name:<24} start {start}  took {duration}  [{node['status']}]")
+        print(f"  Wall time: {report['wall_time']:.2f}s | Sum of stages: {report['sum_of_stages']:.2f}s | "
+              f"Critical path ({report['critical_path_time']:.2f}s): {' -> '.join(report['critical_path'])}")
+        return report
@@ -0,0 +1,188 @@
+import contextvars
+import math
+import os
+import threading
+from collections import defaultdict
+
+# USD per million (input, output) tokens; LLM_INPUT/OUTPUT_COST_PER_MTOK override for other models
+MODEL_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gpt-4o": (2.50, 10.00),
+    "llama2": (0.0, 0.0),
+}
+
+_current_ledger = contextvars.ContextVar("token_ledger", default=None)
+_current_symbol = contextvars.ContextVar("token_symbol", default=None)
+
+
+def estimate_tokens(text) -> int:
+    """Local estimate (~4 characters per token) for providers that do not report usage."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def parse_budgets(spec: str) -> dict:
+    """Parses 'stage=tokens,stage=tokens' into a dict."""
+    budgets = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            stage, value = item.split("=", 1)
+            budgets[stage.strip()] = int(value)
+    return budgets
+
+
+class TokenLedger:
+    """Thread-safe record of LLM token usage for one run, with optional run and per-stage budgets."""
+
+    def __init__(self, run_budget: int = None, stage_budgets: dict = None):
+        env_budget = os.environ.get('LLM_RUN_TOKEN_BUDGET')
+        self.run_budget = run_budget if run_budget is not None else (int(env_budget) if env_budget else None)
+        self.stage_budgets = stage_budgets if stage_budgets is not None else parse_budgets(
+            os.environ.get('LLM_STAGE_TOKEN_BUDGETS', ''))
+        self.records = []
+        self.degradations = []
+        self.lock = threading.Lock()
+
+    def record(self, agent: str, stage: str, model: str, input_tokens: int, output_tokens: int,
+               latency: float = 0.0, estimated: bool = False, symbol: str = None):
+        with self.lock:
+            self.records.append({
+                "agent": agent or "unknown",
+                "stage": stage or "unknown",
+                "symbol": symbol,
+                "model": model,
+                "input_tokens": int(input_tokens),
+                "output_tokens": int(output_tokens),
+                "latency": latency,
+                "estimated": estimated,
+            })
+
+    def note_degradation(self, stage: str, action: str, reason: str):
+        print(f" Budget degradation in {stage}: {action} ({reason})")
+        with self.lock:
+            self.degradations.append({"stage": stage, "action": action, "reason": reason})
+
+    def used(self, stage: str = None) -> int:
+        with self.lock:
+            return sum(r["input_tokens"] + r["output_tokens"] for r in self.records
+                       if stage is None or r["stage"] == stage)
+
+    def remaining(self, stage: str = None) -> float:
+        """Tokens left under the tighter of the run budget and the stage budget."""
+        remaining = math.inf
+        if self.run_budget is not None:
+            remaining = self.run_budget - self.used()
+        if stage is not None and stage in self.stage_budgets:
+            remaining = min(remaining, self.stage_budgets[stage] - self.used(stage))
+        return remaining
+
+    def allows(self, tokens: int, stage: str = None) -> bool:
+        return tokens <= self.remaining(stage)
+
+    @staticmethod
+    def cost(model: str, input_tokens: int, output_tokens: int) -> float:
+        input_price, output_price = MODEL_PRICES.get(model, (
+            float(os.environ.get('LLM_INPUT_COST_PER_MTOK', 0)), float(os.environ.get('LLM_OUTPUT_COST_PER_MTOK', 0))))
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def summary(self) -> dict:
+        """Totals grouped by stage, agent and symbol."""
+        with self.lock:
+            records = list(self.records)
+            degradations = list(self.degradations)
+
+        def empty():
+            return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "latency": 0.0, "cost_usd": 0.0}
+
+        groups = {"by_stage": defaultdict(empty), "by_agent": defaultdict(empty), "by_symbol": defaultdict(empty)}
+        total = empty()
+        for r in records:
+            cost = self.cost(r["model"], r["input_tokens"], r["output_tokens"])
+            for bucket in (total, groups["by_stage"][r["stage"]], groups["by_agent"][r["agent"]],
+                           groups["by_symbol"][r["symbol"] or "unknown"]):
+                bucket["calls"] += 1
+                bucket["input_tokens"] += r["input_tokens"]
+                bucket["output_tokens"] += r["output_tokens"]
+                bucket["latency"] = round(bucket["latency"] + r["latency"], 3)
+                bucket["cost_usd"] = round(bucket["cost_usd"] + cost, 6)
+        return {
+            "total": total,
+            **{name: dict(group) for name, group in groups.items()},
+            "estimated_calls": sum(r["estimated"] for r in records),
+            "degradations": degradations,
+            "run_budget": self.run_budget,
+            "stage_budgets": self.stage_budgets,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print("\n--- Token Usage ---")
+        for stage, usage in summary["by_stage"].items():
+            budget = self.stage_budgets.get(stage)
+            print(f"  {stage:<16} calls {usage['calls']:>3}  in {usage['input_tokens']:>8}  out {usage['output_tokens']:>7}"
+                  f"  {usage['latency']:>7.2f}s  ${usage['cost_usd']:.4f}" + (f"  (budget {budget})" if budget else ""))
+        total = summary["total"]
+        print(f"  Total: {total['input_tokens'] + total['output_tokens']} tokens, ${total['cost_usd']:.4f}"
+              + (f" of {self.run_budget} budget" if self.run_budget else "")
+              + (f" | {summary['estimated_calls']} calls estimated locally" if summary['estimated_calls'] else ""))
+        for event in summary["degradations"]:
+            print(f"  Degraded {event['stage']}: {event['action']} ({event['reason']})")
+        return summary
+
+
+# ------------------------------------------------------------
+# Run-scoped ledger (propagated through contextvars)
+# ------------------------------------------------------------
+class use_ledger:
+    """Makes `ledger` the current ledger (and `symbol` the current symbol) inside the block."""
+
+    def __init__(self, ledger: TokenLedger, symbol: str = None):
+        self.ledger = ledger
+        self.symbol = symbol
+
+    def __enter__(self):
+        self._tokens = (_current_ledger.set(self.ledger), _current_symbol.set(self.symbol))
+        return self.ledger
+
+    def __exit__(self, *exc):
+        _current_ledger.reset(self._tokens[0])
+        _current_symbol.reset(self._tokens[1])
+
+
+def current_ledger() -> TokenLedger:
+    return _current_ledger.get()
+
+
+def bind_context(fn):
+    """Wraps fn so each call (e.g. on a pool thread) runs with the caller's ledger and symbol."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def stage_allows(stage: str, tokens: int) -> bool:
+    ledger = current_ledger()
+    return ledger is None or ledger.allows(tokens, stage)
+
+
+def stage_remaining(stage: str) -> float:
+    ledger = current_ledger()
+    return math.inf if ledger is None else ledger.remaining(stage)
+
+
+def note_degradation(stage: str, action: str, reason: str):
+    ledger = current_ledger()
+    if ledger is not None:
+        ledger.note_degradation(stage, action, reason)
+
+
+def record_usage(agent: str, stage: str, model: str, prompt: str, output: str,
+                 input_tokens: int = None, output_tokens: int = None, latency: float = 0.0):
+    """Records one LLM call on the current ledger, estimating tokens the provider did not report."""
+    ledger = current_ledger()
+    if ledger is None:
+        return
+    estimated = input_tokens is None or output_tokens is None
+    ledger.record(agent, stage, model,
+                  input_tokens if input_tokens is not None else estimate_tokens(prompt),
+                  output_tokens if output_tokens is not None else estimate_tokens(output),
+                  latency=latency, estimated=estimated, symbol=_current_symbol.get())
@@ -1,4 +1,36 @@
+import json
 import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive cross-process lock on `path + '.lock'` (workers sharing the on-disk caches)."""
+    with open(path + ".lock", 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def atomic_write_json(path: str, value):
+    """Writes JSON through a temp file and os.replace, so readers never see a half-written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(value, f, indent=4)
+    os.replace(tmp_path, path)
+
+
 def load_env(filepath="config/aai_520_proj.config"):
     """
     Loads environment variables from the aai_520_project.config.
@@ -0,0 +1,155 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from utils.fundamentals import shared_fetcher
+from utils.job_queue import JobQueue
+from utils.market_data import MarketDataStore
+from utils.profiler import StageProfiler
+from utils.utils import load_env
+
+
+def summarize(state) -> dict:
+    """Compact job result; the thesis itself is written back through MemoryAgent by run_analysis."""
+    return {
+        "thesis_chars": len(state["final_thesis"] or ""),
+        "evaluation": {key: value for key, value in (state.get("evaluation") or {}).items() if key != "evaluation_summary"},
+        "thesis_sources": state.get("thesis_sources"),
+        "tokens": (state.get("usage") or {}).get("total"),
+    }
+
+
+def prefetch_fundamentals(symbols: list):
+    """Fetches a watchlist's fundamentals in one bulk, coalesced pass into the cache every worker reads."""
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    if not symbols:
+        return
+    started = time.perf_counter()
+    table = shared_fetcher().fetch(symbols)
+    print(f"Prefetched fundamentals for {len(table)} of {len(symbols)} symbols in {time.perf_counter() - started:.1f}s")
+
+
+def prefetch_price_history(symbols: list):
+    """Brings a watchlist's price history (and the index) up to date in one bulk yf.download call."""
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    if not symbols:
+        return
+    started = time.perf_counter()
+    store = MarketDataStore()
+    written = store.update(symbols + [store.index_symbol])
+    print(f"Prefetched price history for {len(written)} of {len(symbols) + 1} symbols in {time.perf_counter() - started:.1f}s")
+
+
+def prefetch(symbols: list):
+    """Bulk-fetches what every job of a watchlist needs, so jobs read it from the shared on-disk stores."""
+    prefetch_fundamentals(symbols)
+    prefetch_price_history(symbols)
+
+
+def heartbeat(queue: JobQueue, job_id: int, worker_id: str, stop: threading.Event, lost: threading.Event):
+    """Renews the lease every third of its length until the job finishes."""
+    while not stop.wait(queue.lease_seconds / 3):
+        if not queue.heartbeat(job_id, worker_id):
+            print(f"[{worker_id}] Lost the lease on job {job_id}; its result will be discarded.")
+            lost.set()
+            return
+
+
+def run_job(queue: JobQueue, job: dict, worker_id: str, profile_dir: str = None):
+    from main import run_analysis
+
+    stop, lost = threading.Event(), threading.Event()
+    beat = threading.Thread(target=heartbeat, args=(queue, job["id"], worker_id, stop, lost), daemon=True)
+    beat.start()
+    started = time.perf_counter()
+    try:
+        if profile_dir:
+            out_dir = os.path.join(profile_dir, f"{job['symbol']}-job{job['id']}-{os.getpid()}")
+            with StageProfiler(out_dir) as profiler:
+                state = run_analysis(job["symbol"], profiler=profiler)
+        else:
+            state = run_analysis(job["symbol"])
+        if lost.is_set():
+            return
+        if state is not None and not isinstance(state, str) and state["final_thesis"]:
+            queue.complete(job["id"], worker_id, {**summarize(state), "seconds": round(time.perf_counter() - started, 2)})
+            print(f"[{worker_id}] Job {job['id']} ({job['symbol']}) done in {time.perf_counter() - started:.1f}s")
+        else:
+            queue.fail(job["id"], worker_id, state if isinstance(state, str) else "No thesis generated")
+    except Exception as e:
+        print(f"[{worker_id}] Job {job['id']} ({job['symbol']}) failed: {e}")
+        queue.fail(job["id"], worker_id, traceback.format_exc())
+    finally:
+        stop.set()
+
+
+def work(index: int, drain: bool = False, poll_interval: float = None, profile_dir: str = None):
+    """Worker process loop: lease a symbol job, analyze it, report, repeat."""
+    load_env()
+    queue = JobQueue()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    poll_interval = float(poll_interval or os.environ.get('JOB_POLL_SECONDS', 5))
+    print(f"[{worker_id}] Worker started on {queue.path}")
+    while True:
+        job = queue.lease(worker_id)
+        if job is None:
+            if drain:
+                print(f"[{worker_id}] Queue drained, exiting.")
+                return
+            time.sleep(poll_interval)
+            continue
+        print(f"[{worker_id}] Leased job {job['id']} ({job['symbol']}, attempt {job['attempts']}/{job['max_attempts']})")
+        run_job(queue, job, worker_id, profile_dir)
+
+
+def run_workers(processes: int, drain: bool = False, profile_dir: str = None):
+    """Starts one process per worker (each with its own interpreter, so CPU-bound work is not GIL-bound)."""
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=work, args=(index, drain, None, profile_dir), name=f"worker-{index}")
+               for index in range(processes)]
+    started = time.perf_counter()
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        for process in workers:
+            process.terminate()
+    print(f"{processes} worker(s) finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run symbol analyses from a durable SQLite job queue.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="Queue one analysis job per symbol.")
+    enqueue.add_argument("symbols", nargs="+")
+    run = commands.add_parser("run", help="Start worker processes on this host.")
+    run.add_argument("--processes", type=int, default=int(os.environ.get('WORKER_PROCESSES', os.cpu_count() or 1)))
+    run.add_argument("--drain", action="store_true", help="Exit once the queue is empty instead of polling.")
+    run.add_argument("--prefetch", type=int, default=500, metavar="N",
+                     help="Bulk-fetch fundamentals and price history of up to N queued jobs before starting (0 to skip).")
+    run.add_argument("--profile", nargs="?", const="profiles", metavar="DIR",
+                     help="Profile each job per stage and write a report under DIR (default: profiles).")
+    status = commands.add_parser("status", help="Show job counts and recent jobs.")
+    status.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    load_env()
+    if args.command == "enqueue":
+        ids = JobQueue().enqueue(args.symbols)
+        print(f"Queued jobs: {dict(zip((s.upper() for s in args.symbols), ids))}")
+        prefetch(args.symbols)
+    elif args.command == "run":
+        prefetch([job["symbol"] for job in JobQueue().jobs(status="queued", limit=args.prefetch)])
+        run_workers(args.processes, drain=args.drain, profile_dir=args.profile)
+    else:
+        queue = JobQueue()
+        print(json.dumps(queue.counts(), indent=4))
+        for job in queue.jobs(limit=args.limit):
+            print(f"  {job['id']:>5} {job['symbol']:<8} {job['status']:<7} attempts {job['attempts']}/{job['max_attempts']}"
+                  f"  {job['lease_owner'] or '':<28} {(job['error'] or '')[:60]}")